@@ -0,0 +1,164 @@
+import json
+
+from click import command, option
+
+from skill.Intent import Intent, IntentRouter
+from skill.SberUserHub import SberUserHub
+from skill.VkUserHub import VkUserHub
+
+from .load import VOICE_SCRIPT, SBER_SCRIPT, ORDINALS
+from .normalize import measure
+
+
+EXTRA_UTTERANCES = (
+    'что ты умеешь', 'что ты можешь', 'давай дальше', 'стоп', 'хочу навык оранжевая нить', 'открой четвёртый',
+    'давай вперёд', 'возьми десятый', 'возьми одиннадцатый', 'ping', ''
+)
+
+EXTRA_SBER_UTTERANCES = (
+    'что ты уметь', 'что ты мочь', 'запустить нужный навык', 'взять 10', 'взять 11', 'взять 21', 'давать далекий', 'стоп'
+)
+
+
+class LegacyVocabulary:  # the chain of substring checks which the router replaces
+
+    def should_reset_threads(self, utterance: str):
+        return 'хочу' in utterance
+
+    def should_stop(self, utterance: str):
+        return 'стоп' in utterance
+
+    def should_continue(self, utterance: str):
+        return 'дальше' in utterance or 'скилл' in utterance or 'skill' in utterance
+
+    def should_rewind(self, utterance: str):
+        return 'включи' in utterance
+
+    def should_go_forward(self, utterance: str):
+        return 'вперед' in utterance or 'вперёд' in utterance
+
+    def should_go_back(self, utterance: str):
+        return 'назад' in utterance
+
+    def should_repeat(self, utterance: str):
+        return 'поиграем' in utterance
+
+    def should_help(self, utterance: str):
+        return 'можешь' in utterance or 'умеешь' in utterance or 'можете' in utterance or 'умеете' in utterance
+
+    def should_run_callback(self, utterance: str):
+        return False
+
+    def infer_index(self, utterance: str):
+        for i, ordinal in enumerate(ORDINALS):
+            if ordinal in utterance or (i == 3 and 'четвёртый' in utterance):
+                return i
+
+        return None
+
+    def classify(self, utterance: str):  # every check is made, which is what happens to an utterance that picks a thread
+        checks = (
+            (Intent.CALLBACK, self.should_run_callback), (Intent.HELP, self.should_help), (Intent.RESET, self.should_reset_threads),
+            (Intent.STOP, self.should_stop), (Intent.REPEAT, self.should_repeat), (Intent.CONTINUE, self.should_continue),
+            (Intent.REWIND, self.should_rewind), (Intent.FORWARD, self.should_go_forward), (Intent.BACK, self.should_go_back)
+        )
+
+        return frozenset(intent for intent, check in checks if check(utterance)), self.infer_index(utterance)
+
+
+class LegacySberVocabulary(LegacyVocabulary):
+
+    def should_reset_threads(self, utterance: str):
+        return 'хотеть' in utterance
+
+    def should_continue(self, utterance: str):
+        return 'далекий' in utterance or 'скил' in utterance or 'skill' in utterance
+
+    def should_repeat(self, utterance: str):
+        return 'поиграть' in utterance
+
+    def should_help(self, utterance: str):
+        return 'мочь' in utterance or 'уметь' in utterance
+
+    def should_run_callback(self, utterance: str):
+        return 'нужный' in utterance
+
+    def infer_index(self, utterance: str):
+        if '10' in utterance:
+            return 9
+
+        for i in range(9):
+            if str(i + 1) in utterance:
+                return i
+
+        return None
+
+
+def load_utterances(capture: str):  # (vendor, utterance) pairs from a traffic capture
+    utterances = []
+
+    with open(capture, 'r', encoding = 'utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+
+            record = json.loads(line)
+            request = record['request']
+
+            if record['path'] == '/app-connector':
+                vendor, utterance = 'sber', request.get('payload', {}).get('annotations', {}).get('unified_normalized_text')
+            else:
+                vendor, utterance = 'vk', request.get('request', {}).get('original_utterance')
+
+            if utterance is not None:
+                utterances.append((vendor, utterance.lower().strip()))
+
+    return utterances
+
+
+def make_utterances():  # (vendor, utterance) pairs from the load benchmark scripts and a few extra phrases
+    utterances = []
+
+    for i, ordinal in enumerate(ORDINALS):
+        utterances.extend(('vk', utterance.format(ordinal = ordinal)) for _, utterance in VOICE_SCRIPT)
+        utterances.extend(('sber', utterance.format(number = i + 1)) for _, utterance in SBER_SCRIPT)
+
+    utterances.extend(('vk', utterance) for utterance in EXTRA_UTTERANCES)
+    utterances.extend(('sber', utterance) for utterance in EXTRA_SBER_UTTERANCES)
+
+    return utterances
+
+
+@command()
+@option('--capture', '-c', type = str, default = None, help = 'file with captured traffic to take utterances from, scripted utterances are used if omitted')
+@option('--n-repeats', '-r', type = int, default = 5)
+@option('--scale', '-s', type = int, default = 100, help = 'number of times each utterance is classified in a run')
+def main(capture: str, n_repeats: int, scale: int):
+    utterances = make_utterances() if capture is None else load_utterances(capture)
+
+    routers = {hub.vendor: IntentRouter(hub.vocabulary, hub.ordinals) for hub in (SberUserHub, VkUserHub)}
+    legacy = {'sber': LegacySberVocabulary(), 'vk': LegacyVocabulary()}
+
+    pairs = [(legacy[vendor], routers[vendor], utterance) for vendor, utterance in utterances] * scale
+
+    expected, legacy_time = measure(lambda: [vocabulary.classify(utterance) for vocabulary, _, utterance in pairs], n_repeats)
+    actual, router_time = measure(lambda: [router.classify(utterance) for _, router, utterance in pairs], n_repeats)
+
+    mismatches = [
+        (utterance, lhs, rhs)
+        for (_, utterance), lhs, rhs in zip(utterances, expected, actual)
+        if lhs != rhs
+    ]
+
+    print(f'Utterances: {len(utterances)}, classifications per run: {len(pairs)}')
+    print(f'Identical classifications: {len(utterances) - len(mismatches)} / {len(utterances)}')
+
+    for utterance, lhs, rhs in mismatches[:5]:
+        print(f'Mismatch for {utterance!r}:\n  legacy: {lhs!r}\n  router: {rhs!r}')
+
+    print(f'Legacy: {legacy_time:.4f}s')
+    print(f'Router: {router_time:.4f}s ({legacy_time / router_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+import json
+import re
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from random import Random
+from time import perf_counter, sleep
+
+from click import command, option
+
+from skill.Handler import LOADING_CATALOG_TEXT, LOADING_THREAD_TEXT
+from skill.Server import Server
+
+
+Topic = namedtuple('Topic', ('title', 'comments'))
+
+WORDS = (
+    'анон', 'тред', 'двач', 'пост', 'ответ', 'сегодня', 'вчера', 'работа', 'кот', 'мем', 'игра', 'музыка',
+    'почему', 'когда', 'никогда', 'всегда', 'хорошо', 'плохо', 'очень', 'просто'
+)
+
+PERCENTILES = (50, 95, 99)
+
+INTERIM = 'interim'  # replies asking to try again because loading took longer than the deadline
+
+# (intent, utterance) pairs, the index is picked among the threads listed by the last list step
+VOICE_SCRIPT = (
+    ('list', 'запусти навык оранжевая нить'),
+    ('pick', 'возьми {ordinal}'),
+    ('continue', 'запусти скилл оранжевая нить'),
+    ('continue', 'запусти скилл оранжевая нить'),
+    ('rewind', 'включи оранжевую нить'),
+    ('repeat', 'давай поиграем в нити'),
+    ('forward', 'давай вперед'),
+    ('continue', 'запусти скилл оранжевая нить'),
+    ('back', 'давай назад'),
+    ('list', 'запусти навык оранжевая нить'),
+    ('reset', 'хочу навык оранжевая нить'),
+    ('stop', 'стоп')
+)
+
+SBER_SCRIPT = (
+    ('list', 'запустить навык оранжевый нить'),
+    ('pick', 'взять {number}'),
+    ('continue', 'запустить скил оранжевый нить'),
+    ('continue', 'запустить скил оранжевый нить'),
+    ('rewind', 'включи оранжевый нить'),
+    ('repeat', 'давать поиграть в нить'),
+    ('forward', 'давать вперед'),
+    ('continue', 'запустить скил оранжевый нить'),
+    ('back', 'давать назад'),
+    ('list', 'запустить навык оранжевый нить'),
+    ('reset', 'хотеть навык оранжевый нить'),
+    ('stop', 'стоп')
+)
+
+HEADER_NUMBER = re.compile(r'Тред номер (\d+)')
+
+ORDINALS = ('первый', 'второй', 'третий', 'четвертый', 'пятый', 'шестой', 'седьмой', 'восьмой', 'девятый', 'десятый')
+
+
+def make_text(random: Random, n_words: int):
+    return ' '.join(random.choice(WORDS) for _ in range(n_words))
+
+
+def make_catalog(n_threads: int, seed: int):
+    random = Random(seed)
+
+    return [
+        {
+            'comment': f'<strong>{make_text(random, 3)}</strong><br>{make_text(random, random.randint(5, 40))}',
+            'posts_count': random.randint(1, 1500),
+            'num': 100000 + i
+        }
+        for i in range(n_threads)
+    ]
+
+
+class SyntheticFetcher:  # replaces much.Fetcher of the upstream client, generates the same posts for the same thread
+
+    def __init__(self, n_posts: int, latency: float):
+        self.n_posts = n_posts
+        self.latency = latency
+
+    def fetch(self, url: str, verbose: bool = False):
+        random = Random(url)
+
+        if self.latency > 0:
+            sleep(self.latency)
+
+        topics = []
+        n_posts = 0
+
+        while n_posts < self.n_posts:
+            comments = tuple(make_text(random, random.randint(5, 120)) for _ in range(random.randint(0, 5)))
+            topics.append(Topic(make_text(random, random.randint(5, 200)), comments))
+            n_posts += 1 + len(comments)
+
+        return topics
+
+
+def make_request(vendor: str, user_id: str, utterance: str, message_id: int):
+    if vendor == 'sber':
+        return '/app-connector', {
+            'messageId': message_id,
+            'sessionId': f'session-{user_id}',
+            'uuid': {'userId': user_id},
+            'payload': {'annotations': {'unified_normalized_text': utterance}, 'device': {}}
+        }
+
+    request = {
+        'request': {'original_utterance': utterance},
+        'session': {'user': {'user_id': user_id}},
+        'version': '1.0'
+    }
+
+    if vendor == 'yandex':
+        request['meta'] = {'client_id': 'ru.yandex.searchplugin/7.16'}
+        request['state'] = {'session': {}}
+
+    return '/', request
+
+
+def converse(app, vendor: str, user_id: str, seed: int, n_conversations: int):  # latencies of all requests made by a single user
+    client = app.test_client()
+    random = Random(seed)
+    script = SBER_SCRIPT if vendor == 'sber' else VOICE_SCRIPT
+
+    samples = []
+    message_id = 0
+
+    for _ in range(n_conversations):
+        index = 0
+        deferred = None  # intent answered with an interim reply, the next utterance gets its actual reply
+
+        for intent, utterance in script:
+            path, body = make_request(vendor, user_id, utterance.format(ordinal = ORDINALS[index], number = index + 1), message_id)
+            message_id += 1
+
+            start = perf_counter()
+            response = client.post(path, json = body)
+            elapsed = perf_counter() - start
+
+            text = response.get_data(as_text = True)
+
+            if LOADING_THREAD_TEXT in text or LOADING_CATALOG_TEXT in text:
+                samples.append((vendor, INTERIM, elapsed, response.status_code))
+                deferred = deferred or intent
+                continue
+
+            intent, deferred = deferred or intent, None
+            samples.append((vendor, intent, elapsed, response.status_code))
+
+            if intent == 'list' and (numbers := HEADER_NUMBER.findall(text)):  # a page fits fewer threads if their titles are long
+                index = random.randrange(max(int(number) for number in numbers))
+
+    return samples
+
+
+def percentile(values: list[float], percent: int):  # nearest rank
+    return values[min(len(values) - 1, max(0, round(percent / 100 * len(values)) - 1))]
+
+
+def summarize(samples: list[tuple], elapsed: float):
+    groups = defaultdict(list)
+    errors = defaultdict(int)
+
+    for vendor, intent, latency, status_code in samples:
+        groups[(vendor, intent)].append(latency)
+
+        if intent != INTERIM:  # interim replies are sent at the deadline whatever the load, so they are kept out of the totals
+            groups[(vendor, '*')].append(latency)
+            groups[('*', '*')].append(latency)
+
+        if status_code != 200:
+            errors[(vendor, intent)] += 1
+
+    n_interim = sum(1 for sample in samples if sample[1] == INTERIM)
+
+    return {
+        'requests': len(samples),
+        'interim': n_interim,
+        'elapsed': elapsed,
+        'throughput': (len(samples) - n_interim) / elapsed,
+        'latency': {
+            f'{vendor}/{intent}': {
+                'count': len(latencies),
+                'errors': errors[(vendor, intent)],
+                **{f'p{percent}': percentile(sorted(latencies), percent) for percent in PERCENTILES}
+            }
+            for (vendor, intent), latencies in sorted(groups.items())
+        }
+    }
+
+
+def report(summary: dict, baseline: dict = None):
+    print(f'Requests: {summary["requests"]} ({summary.get("interim", 0)} interim), elapsed: {summary["elapsed"]:.2f}s, throughput: {summary["throughput"]:.1f} rps', end = '')
+
+    if baseline is not None:
+        print(f' (baseline {baseline["throughput"]:.1f} rps)', end = '')
+
+    print()
+    print(f'{"vendor/intent":<20}{"count":>8}{"errors":>8}' + ''.join(f'{f"p{percent}, ms":>12}' for percent in PERCENTILES))
+
+    for key, stats in summary['latency'].items():
+        line = f'{key:<20}{stats["count"]:>8}{stats["errors"]:>8}'
+
+        for percent in PERCENTILES:
+            value = stats[f'p{percent}'] * 1000
+
+            if baseline is not None and (baseline_stats := baseline['latency'].get(key)) is not None:
+                line += f'{value:>8.2f}{value / (baseline_stats[f"p{percent}"] * 1000) - 1:>+4.0%}'
+            else:
+                line += f'{value:>12.2f}'
+
+        print(line)
+
+
+@command()
+@option('--n-users', '-u', type = int, default = 30, help = 'number of simulated users of each vendor')
+@option('--n-conversations', '-n', type = int, default = 3, help = 'number of scripted conversations per user')
+@option('--concurrency', '-c', type = int, default = 16, help = 'number of users talking at the same time')
+@option('--n-threads', '-t', type = int, default = 200, help = 'number of threads in the synthetic catalog')
+@option('--n-posts', '-p', type = int, default = 500, help = 'number of posts in each synthetic thread')
+@option('--latency', '-l', type = float, default = 0.0, help = 'seconds of simulated upstream latency per thread download')
+@option('--deadline', '-d', type = float, default = None, help = 'seconds to respond in, interim replies are counted separately (no deadline by default)')
+@option('--vendors', '-v', type = str, default = 'sber,vk,yandex')
+@option('--seed', '-s', type = int, default = 17)
+@option('--save', type = str, default = None, help = 'file to save the summary to, to be used as a baseline later')
+@option('--baseline', '-b', type = str, default = None, help = 'file with a previously saved summary to compare against')
+def main(n_users: int, n_conversations: int, concurrency: int, n_threads: int, n_posts: int, latency: float, deadline: float, vendors: str, seed: int, save: str, baseline: str):
+    server = Server(deadline = deadline)
+
+    catalog = make_catalog(n_threads, seed)
+    server.catalog._pull = lambda: catalog
+
+    server.upstream.fetcher = SyntheticFetcher(n_posts, latency)
+
+    users = [
+        (vendor, f'{vendor}-user-{i}', seed + i)
+        for i in range(n_users)
+        for vendor in vendors.split(',')
+    ]
+
+    start = perf_counter()
+
+    with ThreadPoolExecutor(max_workers = concurrency) as executor:
+        samples = [
+            sample
+            for samples in executor.map(lambda user: converse(server.app, *user, n_conversations), users)
+            for sample in samples
+        ]
+
+    summary = summarize(samples, perf_counter() - start)
+
+    server.posts._background_loader.shutdown()  # threads requested right before the conversations ended finish loading before the interpreter exits
+
+    if baseline is not None:
+        with open(baseline, 'r', encoding = 'utf-8') as file:
+            baseline = json.load(file)
+
+    report(summary, baseline)
+
+    if save is not None:
+        with open(save, 'w', encoding = 'utf-8') as file:
+            json.dump(summary, file, indent = 2)
+
+
+if __name__ == '__main__':
+    main()
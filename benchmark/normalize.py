@@ -0,0 +1,111 @@
+import re
+import json
+from time import perf_counter
+
+from click import command, option
+from emoji import replace_emoji
+from much import Fetcher
+
+from skill.Catalog import Catalog
+from skill.util import normalize, normalize_many
+
+
+URL_REGEXP = re.compile(r'http[^\s]+')
+HANDLE_REGEXP = re.compile(r'@[^\s]+')
+SPACE_REGEXP = re.compile(r'\s+')
+REF_MARK = re.compile(r'^>')
+
+EDGE_CASES = (  # texts on which the fused pattern used to differ from the sequential implementation, always added to the corpus
+    '@userhttp\nok', 'me@mail.ruhttp', 'x @http', 'слово\ufe0f', 'x\ufe0fy', 'a \ufe0f b', '\ufe0f', '@\ufe0e', '\ufe0e>ref',
+    '😀\u200d', '😀\u200dx', '😀\ufe0f\u200dx', 'a\u200d\u200db', '🌈\ufe0f\u200d#', '🏳\ufe0f\u200dx', '❤\ufe0f\u200d👨', '👩🏻\u200dx',
+    '👨\u200d👩\u200d👧', '🏳\ufe0f\u200d🌈', '1\ufe0f\u20e3', '👍\ufe0f🏻'
+)
+
+
+def normalize_sequentially(text: str):  # implementation which runs a separate pass for every kind of noise
+    return SPACE_REGEXP.sub(
+        ' ',
+        replace_emoji(
+            HANDLE_REGEXP.sub(
+                ' ',
+                URL_REGEXP.sub(
+                    ' ',
+                    REF_MARK.sub(
+                        ' ',
+                        text.replace('☹️', '')
+                    )
+                )
+            ),
+            ' '
+        )
+    )
+
+
+def pull_corpus(n_threads: int):  # raw posts of the largest threads from the live catalog
+    fetcher = Fetcher()
+    posts = []
+
+    for thread in Catalog().snapshot.threads[:n_threads]:
+        print(f'Pulling {thread.link}...')
+
+        for topic in fetcher.fetch(thread.link):
+            posts.append(topic.title)
+            posts.extend(topic.comments)
+
+    return posts
+
+
+def measure(function, n_repeats: int):  # the best time out of several runs
+    best = None
+
+    for _ in range(n_repeats):
+        start = perf_counter()
+        result = function()
+        elapsed = perf_counter() - start
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return result, best
+
+
+@command()
+@option('--corpus', '-c', type = str, default = None, help = 'file with one json-encoded post per line, posts are pulled from 2ch if omitted')
+@option('--save-corpus', '-s', type = str, default = None, help = 'file to save pulled posts to')
+@option('--n-threads', '-t', type = int, default = 10, help = 'number of threads to pull when corpus is not provided')
+@option('--n-repeats', '-r', type = int, default = 5)
+def main(corpus: str, save_corpus: str, n_threads: int, n_repeats: int):
+    if corpus is None:
+        posts = pull_corpus(n_threads)
+    else:
+        with open(corpus, 'r', encoding = 'utf-8') as file:
+            posts = [json.loads(line) for line in file if line.strip()]
+
+    if save_corpus is not None:
+        with open(save_corpus, 'w', encoding = 'utf-8') as file:
+            for post in posts:
+                file.write(json.dumps(post, ensure_ascii = False) + '\n')
+
+    posts = [*posts, *EDGE_CASES]
+
+    normalize('')  # compile the pattern before measuring
+
+    expected, sequential_time = measure(lambda: [normalize_sequentially(post) for post in posts], n_repeats)
+    actual, fused_time = measure(lambda: [normalize(post) for post in posts], n_repeats)
+    batch, batch_time = measure(lambda: normalize_many(posts), n_repeats)
+
+    mismatches = [(post, lhs, rhs) for post, lhs, rhs in zip(posts, expected, actual) if lhs != rhs]
+
+    print(f'Posts: {len(posts)}, characters: {sum(len(post) for post in posts)}')
+    print(f'Identical outputs: {len(posts) - len(mismatches)} / {len(posts)}, batch matches single: {batch == actual}')
+
+    for post, lhs, rhs in mismatches[:5]:
+        print(f'Mismatch for {post!r}:\n  sequential: {lhs!r}\n  fused:      {rhs!r}')
+
+    print(f'Sequential: {sequential_time:.4f}s')
+    print(f'Fused:      {fused_time:.4f}s ({sequential_time / fused_time:.2f}x)')
+    print(f'Batch:      {batch_time:.4f}s ({sequential_time / batch_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
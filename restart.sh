@@ -15,4 +15,8 @@ fi
 
 sleep $delay
 
+until curl -sf http://localhost:1217/ready > /dev/null; do  # don't expose the server while it is warming up
+    sleep 1
+done
+
 ngrok http --domain=exotic-frog-blessed.ngrok-free.app http://localhost:1217 --log=stdout > ngrok.log.txt &
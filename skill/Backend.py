@@ -0,0 +1,225 @@
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+from os import getpid
+from threading import local
+from time import time
+
+from .Session import Session, SessionStore
+
+
+SQLITE_TIMEOUT = 30  # seconds to wait for a lock held by another worker
+CLEANUP_PERIOD = 1000  # number of writes between removals of expired records
+N_SNAPSHOTS = 64  # number of recent catalog snapshots kept in the shared store
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sessions (
+    namespace TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, user_id)
+);
+CREATE INDEX IF NOT EXISTS sessions_accessed ON sessions (namespace, accessed);
+
+CREATE TABLE IF NOT EXISTS posts (
+    namespace TEXT NOT NULL,
+    thread_id INTEGER NOT NULL,
+    posts TEXT NOT NULL,
+    time REAL NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, thread_id)
+);
+CREATE INDEX IF NOT EXISTS posts_accessed ON posts (namespace, accessed);
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    version INTEGER PRIMARY KEY,
+    state TEXT NOT NULL,
+    time REAL NOT NULL
+);
+'''
+
+
+class Backend(ABC):  # storage for the state which must be visible to every worker process serving the skill
+    shared = False
+
+    @abstractmethod
+    def make_session_store(self, namespace: str, timeout: float, max_sessions: int):
+        pass
+
+    @abstractmethod
+    def make_post_store(self, namespace: str, max_size: int):  # None if downloaded posts are kept only in the process memory
+        pass
+
+    @abstractmethod
+    def save_snapshot(self, snapshot):
+        pass
+
+    @abstractmethod
+    def load_snapshot(self, version: int):  # serialized catalog snapshot or None
+        pass
+
+
+class MemoryBackend(Backend):  # state lives in the process, so the server can run only a single worker
+
+    def make_session_store(self, namespace: str, timeout: float, max_sessions: int):
+        return SessionStore(timeout, max_sessions)
+
+    def make_post_store(self, namespace: str, max_size: int):
+        return None
+
+    def save_snapshot(self, snapshot):
+        pass
+
+    def load_snapshot(self, version: int):
+        return None
+
+
+class SqliteDatabase:  # local database file which may be opened by several threads and worker processes at once
+
+    def __init__(self, path: str, schema: str):
+        self.path = path
+        self._local = local()
+
+        self.connection.executescript(schema)
+
+    @property
+    def connection(self):  # sqlite connections can't be shared between threads and must not survive a fork
+        local_ = self._local
+
+        if getattr(local_, 'pid', None) != (pid := getpid()):
+            local_.connection = connection = sqlite3.connect(self.path, timeout = SQLITE_TIMEOUT, isolation_level = None)
+            local_.pid = pid
+
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+
+        return local_.connection
+
+
+class SqliteBackend(SqliteDatabase, Backend):  # state lives in a database file shared by all worker processes
+    shared = True
+
+    def __init__(self, path: str):
+        super().__init__(path, SCHEMA)
+
+    def make_session_store(self, namespace: str, timeout: float, max_sessions: int):
+        return SqliteSessionStore(self, namespace, timeout, max_sessions)
+
+    def make_post_store(self, namespace: str, max_size: int):
+        return SqlitePostStore(self, namespace, max_size)
+
+    def save_snapshot(self, snapshot):
+        connection = self.connection
+
+        connection.execute(
+            'INSERT OR IGNORE INTO snapshots (version, state, time) VALUES (?, ?, ?)',
+            (snapshot.version, json.dumps(snapshot.to_dict(), ensure_ascii = False), snapshot.time)
+        )
+        connection.execute(
+            'DELETE FROM snapshots WHERE version NOT IN (SELECT version FROM snapshots ORDER BY time DESC LIMIT ?)',
+            (N_SNAPSHOTS, )
+        )
+
+    def load_snapshot(self, version: int):
+        if (row := self.connection.execute('SELECT state FROM snapshots WHERE version = ?', (version, )).fetchone()) is None:
+            return None
+
+        return json.loads(row[0])
+
+
+class SqliteSessionStore:
+
+    def __init__(self, backend: SqliteBackend, namespace: str, timeout: float, max_sessions: int):
+        self.backend = backend
+        self.namespace = namespace
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+
+        self._n_writes = 0
+
+    def __len__(self):
+        return self.backend.connection.execute(
+            'SELECT COUNT(*) FROM sessions WHERE namespace = ? AND accessed >= ?',
+            (self.namespace, time() - self.timeout)
+        ).fetchone()[0]
+
+    def get(self, user_id: str):
+        row = self.backend.connection.execute(
+            'SELECT state FROM sessions WHERE namespace = ? AND user_id = ? AND accessed >= ?',
+            (self.namespace, user_id, time() - self.timeout)
+        ).fetchone()
+
+        return None if row is None else Session.from_dict(json.loads(row[0]))
+
+    def put(self, user_id: str, session: Session):
+        connection = self.backend.connection
+        current_time = time()
+
+        connection.execute(
+            'INSERT INTO sessions (namespace, user_id, state, accessed) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (namespace, user_id) DO UPDATE SET state = excluded.state, accessed = excluded.accessed',
+            (self.namespace, user_id, json.dumps(session.to_dict()), current_time)
+        )
+
+        self._n_writes += 1
+
+        if self._n_writes % CLEANUP_PERIOD == 0:
+            connection.execute(
+                'DELETE FROM sessions WHERE namespace = ? AND ('
+                'accessed < ? OR '
+                'user_id NOT IN (SELECT user_id FROM sessions WHERE namespace = ? ORDER BY accessed DESC LIMIT ?)'
+                ')',
+                (self.namespace, current_time - self.timeout, self.namespace, self.max_sessions)
+            )
+
+
+class SqlitePostStore:  # shared second level post cache, evicts least recently used threads when their total size exceeds the budget
+
+    def __init__(self, backend: SqliteBackend, namespace: str, max_size: int = None):
+        self.backend = backend
+        self.namespace = namespace
+        self.max_size = max_size
+
+    def get(self, thread_id: int):  # posts and the time they were downloaded at or None
+        connection = self.backend.connection
+
+        if (
+            row := connection.execute(
+                'SELECT posts, time FROM posts WHERE namespace = ? AND thread_id = ?',
+                (self.namespace, thread_id)
+            ).fetchone()
+        ) is None:
+            return None
+
+        connection.execute(
+            'UPDATE posts SET accessed = ? WHERE namespace = ? AND thread_id = ?',
+            (time(), self.namespace, thread_id)
+        )
+
+        posts, time_ = row
+
+        return json.loads(posts), time_
+
+    def put(self, thread_id: int, posts: list[str], time_: float, size: int):
+        connection = self.backend.connection
+
+        connection.execute(
+            'INSERT OR REPLACE INTO posts (namespace, thread_id, posts, time, size, accessed) VALUES (?, ?, ?, ?, ?, ?)',
+            (self.namespace, thread_id, json.dumps(posts, ensure_ascii = False), time_, size, time())
+        )
+
+        if (max_size := self.max_size) is not None:
+            connection.execute(
+                'DELETE FROM posts WHERE namespace = ? AND thread_id != ? AND thread_id IN ('
+                'SELECT thread_id FROM ('
+                'SELECT thread_id, SUM(size) OVER (ORDER BY accessed DESC) AS total FROM posts WHERE namespace = ?'
+                ') WHERE total > ?'
+                ')',
+                (self.namespace, thread_id, self.namespace, max_size)
+            )
+
+    @property
+    def size(self):
+        return self.backend.connection.execute('SELECT COALESCE(SUM(size), 0) FROM posts WHERE namespace = ?', (self.namespace, )).fetchone()[0]
@@ -0,0 +1,47 @@
+from os import stat
+from threading import Lock
+
+from .util import normalize_spaces, PrefixTrie, get_logger
+
+
+logger = get_logger('catalog')
+
+
+class Blocklist:  # disabled thread starters compiled into a prefix trie
+
+    def __init__(self, disabled_thread_starters: tuple[str] = (), path: str = None):
+        self.path = path
+
+        self._trie = PrefixTrie(disabled_thread_starters)
+        self._mtime = None
+        self._lock = Lock()
+
+        if path is not None:
+            self.reload()
+
+    @classmethod
+    def from_file(cls, path: str):
+        return cls(path = path)
+
+    def reload(self):  # re-read the file if it has changed since the last time, returns True if it has
+        if (path := self.path) is None:
+            return False
+
+        with self._lock:
+            if (mtime := stat(path).st_mtime) == self._mtime:
+                return False
+
+            with open(path, 'r', encoding = 'utf-8') as file:
+                disabled_thread_starters = [line for line in (line.rstrip('\n') for line in file) if line]
+
+            self._trie = PrefixTrie(disabled_thread_starters)  # swapped atomically, readers keep using the old one
+            self._mtime = mtime
+
+            logger.info('Loaded %d disabled thread starters from %s', len(disabled_thread_starters), path)
+
+        return True
+
+    def is_disabled(self, comment: str):
+        from bs4 import BeautifulSoup  # slow to import, titles are checked in background once the server is up
+
+        return self._trie.match_prefix(normalize_spaces(BeautifulSoup(comment, 'lxml').get_text().lower().strip())) is not None
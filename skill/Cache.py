@@ -0,0 +1,83 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class LruCache:  # evicts least recently used entries when the number of entries or their total size exceeds the budget
+
+    def __init__(self, max_entries: int = None, max_size: int = None, sizeof = None):
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.sizeof = (lambda value: 0) if sizeof is None else sizeof
+
+        self._entries = OrderedDict()  # key -> (value, size), the least recently used entry goes first
+        self._lock = Lock()
+
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default = None):
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def peek(self, key, default = None):  # doesn't affect recency and statistics
+        if (entry := self._entries.get(key)) is None:
+            return default
+
+        return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+
+        with self._lock:
+            entries = self._entries
+
+            if (entry := entries.pop(key, None)) is not None:
+                self.size -= entry[1]
+
+            entries[key] = (value, size)
+            self.size += size
+
+            max_entries = self.max_entries
+            max_size = self.max_size
+
+            while len(entries) > 1 and (
+                (max_entries is not None and len(entries) > max_entries) or
+                (max_size is not None and self.size > max_size)
+            ):
+                _, (_, evicted_size) = entries.popitem(last = False)  # the entry which has just been inserted is never evicted
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key, default = None):
+        with self._lock:
+            if (entry := self._entries.pop(key, None)) is None:
+                return default
+
+            self.size -= entry[1]
+
+            return entry[0]
+
+    @property
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
@@ -0,0 +1,114 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from os import getpid, register_at_fork
+from queue import Queue, Full
+from random import random
+from threading import Thread as ExecutableThread, Lock
+from time import time, sleep, perf_counter
+
+from .util import get_logger
+from .Json import RawJson
+
+
+DEFAULT_QUEUE_SIZE = 10000  # records which haven't been written yet, new records are dropped when the queue is full
+
+logger = get_logger('capture')
+
+
+class Capture:  # appends sampled request/response pairs to a jsonl file from a background thread
+
+    def __init__(self, path: str, rate: float = 1.0, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.rate = rate
+
+        self.n_dropped = 0
+
+        self._queue = Queue(maxsize = queue_size)
+        self._pid = None
+        self._start_lock = Lock()
+
+        register_at_fork(after_in_child = self._reset_lock)  # the lock could be held by another thread at the moment of fork
+
+    def _reset_lock(self):
+        self._start_lock = Lock()
+
+    def record(self, path: str, request: dict, response: dict, elapsed: float):  # never blocks the request thread
+        if self.rate < 1 and random() >= self.rate:
+            return
+
+        if self._pid != getpid():  # the writer is started lazily, because threads don't survive fork
+            with self._start_lock:
+                if self._pid != getpid():  # another thread could have started the writer meanwhile
+                    self._start()
+
+        try:
+            self._queue.put_nowait({'time': time(), 'path': path, 'elapsed': elapsed, 'request': request, 'response': response})
+        except Full:
+            self.n_dropped += 1
+
+    def _start(self):
+        self._pid = getpid()
+
+        ExecutableThread(target = self._write, daemon = True).start()
+
+    def _write(self):
+        queue = self._queue
+
+        with open(self.path, 'a', encoding = 'utf-8', buffering = 1) as file:  # line buffering keeps lines of several workers intact
+            while True:
+                record = queue.get()
+
+                try:
+                    if isinstance(response := record['response'], RawJson):
+                        record['response'] = json.loads(response)
+
+                    file.write(json.dumps(record, ensure_ascii = False) + '\n')
+                except (TypeError, ValueError) as e:
+                    logger.warning('Can\'t capture request: %s', e)
+
+
+def replay(path: str, url: str, speed: float = 1.0, concurrency: int = 16, timeout: float = 60):  # original intervals between requests are divided by speed, zero speed means no delays
+    from requests import post  # only needed to replay
+
+    with open(path, 'r', encoding = 'utf-8') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+
+    records.sort(key = lambda record: record['time'])
+
+    def send(record: dict):
+        start = perf_counter()
+
+        try:
+            response = post(url.rstrip('/') + record['path'], json = record['request'], timeout = timeout)
+            status_code = response.status_code
+        except Exception:  # a failed request is reported along with the others
+            status_code = None
+
+        return status_code, perf_counter() - start
+
+    if len(records) < 1:
+        print('No requests to replay')
+        return
+
+    first_time = records[0]['time']
+    start = perf_counter()
+
+    with ThreadPoolExecutor(max_workers = concurrency) as executor:
+        futures = []
+
+        for record in records:
+            if speed > 0 and (delay := (record['time'] - first_time) / speed - (perf_counter() - start)) > 0:
+                sleep(delay)
+
+            futures.append(executor.submit(send, record))
+
+        results = [future.result() for future in futures]
+
+    elapsed = perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    n_errors = sum(1 for status_code, _ in results if status_code != 200)
+
+    print(
+        f'Replayed {len(results)} requests in {elapsed:.2f}s ({len(results) / elapsed:.1f} rps), errors: {n_errors}, '
+        f'median latency: {latencies[len(latencies) // 2] * 1000:.2f}ms, max latency: {latencies[-1] * 1000:.2f}ms'
+    )
@@ -0,0 +1,204 @@
+from collections import OrderedDict
+from hashlib import blake2b
+from threading import Thread as ExecutableThread, Lock, Event
+from time import time, perf_counter
+from operator import attrgetter
+
+from .Thread import Thread
+from .Blocklist import Blocklist
+from .Backend import Backend, MemoryBackend
+from .Metrics import Metrics
+from .util import get_logger
+from .Upstream import Upstream, DEFAULT_TIMEOUT
+
+
+CATALOG_URL = 'https://2ch.su/b/catalog.json'
+DEFAULT_REFRESH_INTERVAL = 60  # seconds
+DEFAULT_HISTORY = 64  # number of recent snapshots which sessions can still refer to
+VERSION_SIZE = 7  # bytes, versions must fit into a signed 64-bit integer to be stored in sqlite
+
+logger = get_logger('catalog')
+
+
+class CatalogSnapshot:  # immutable list of threads ranked by (length, freshness) in descending order
+
+    def __init__(self, threads: tuple[Thread], version: int):
+        self.threads = threads
+        self.version = version
+        self.time = time()
+
+    def __len__(self):
+        return len(self.threads)
+
+    def to_dict(self):
+        return {'version': self.version, 'threads': [thread.to_dict() for thread in self.threads]}
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        return cls(tuple(Thread.from_dict(thread) for thread in state['threads']), state['version'])
+
+    @staticmethod
+    def make_version(threads: tuple[Thread]):  # the same list of threads gets the same version in every worker process
+        digest = blake2b(digest_size = VERSION_SIZE)
+
+        for thread in threads:
+            digest.update(f'{thread.id}:{thread.length};'.encode())
+
+        return int.from_bytes(digest.digest(), 'big')
+
+
+class Catalog:  # process-wide catalog shared by all hubs, refreshed in background
+
+    def __init__(self,
+        blocklist: Blocklist = None, refresh_interval: float = DEFAULT_REFRESH_INTERVAL, timeout: float = DEFAULT_TIMEOUT, history: int = DEFAULT_HISTORY,
+        backend: Backend = None, metrics: Metrics = None, upstream: Upstream = None
+    ):
+        self.blocklist = Blocklist() if blocklist is None else blocklist
+        self.backend = MemoryBackend() if backend is None else backend
+        self.metrics = Metrics() if metrics is None else metrics
+        self.refresh_interval = refresh_interval
+        self.upstream = Upstream(timeout = timeout) if upstream is None else upstream
+        self.history = history
+
+        self._snapshot = None
+        self._titles = {}  # thread id -> (title, thread) of the last pulled catalog, the next snapshot is built from the previous one
+        self._disabled = {}  # thread id -> title of the threads which have been filtered out of the last pulled catalog
+        self._snapshots = OrderedDict()  # version -> snapshot, the oldest goes first
+        self._snapshots_lock = Lock()
+        self._lock = Lock()  # only one refresh at a time
+        self._stopped = Event()
+        self._warm = Event()  # set once the first snapshot is made
+        self._warming = False  # the cold catalog is being pulled in background
+        self._refresher = None
+
+    @property
+    def snapshot(self):
+        if (snapshot := self._snapshot) is None:  # catalog is cold, the first caller pulls it and the rest wait
+            with self._lock:
+                if (snapshot := self._snapshot) is None:
+                    snapshot = self._refresh()
+
+        return snapshot
+
+    def get_snapshot(self, timeout: float = None):  # same as snapshot, but None if the catalog doesn't get warm in time, it keeps being pulled in background then
+        if (snapshot := self._snapshot) is not None or timeout is None:
+            return self.snapshot if snapshot is None else snapshot
+
+        with self._snapshots_lock:
+            if warm_up := not self._warming:
+                self._warming = True
+
+        if warm_up:
+            ExecutableThread(target = self._warm_up, daemon = True).start()
+
+        return self.wait(timeout)
+
+    def _warm_up(self):
+        try:
+            self.snapshot  # pulled once even if the refresher or a caller without a timeout pulls it at the same time
+        except Exception as e:  # the next caller tries again
+            logger.warning('Can\'t pull catalog: %s', e)
+        finally:
+            self._warming = False
+
+    def peek(self):  # the current snapshot or None if the catalog is cold, never pulls it
+        return self._snapshot
+
+    def wait(self, timeout: float = None):  # the current snapshot once the catalog is warm or None if it doesn't get warm in time, never pulls it
+        self._warm.wait(timeout)
+
+        return self._snapshot
+
+    def get(self, version: int):  # None if the snapshot is too old
+        if (snapshot := self._snapshots.get(version)) is not None:
+            return snapshot
+
+        if (state := self.backend.load_snapshot(version)) is None:  # the snapshot could have been made by another worker
+            return None
+
+        self._remember(snapshot := CatalogSnapshot.from_dict(state))
+
+        return snapshot
+
+    def refresh(self):
+        with self._lock:
+            return self._refresh()
+
+    def _pull(self):
+        return self.upstream.get_json(CATALOG_URL)['threads']
+
+    def _timed_pull(self):
+        start = perf_counter()
+
+        try:
+            return self._pull()
+        except Exception:
+            self.metrics.upstream_failures.inc('catalog')
+            raise
+        finally:
+            self.metrics.upstream_duration.observe(perf_counter() - start, 'catalog')
+
+    def _refresh(self):
+        blocklist = self.blocklist
+
+        try:
+            if blocklist.reload():  # every title is checked again
+                self._titles = {}
+                self._disabled = {}
+        except OSError as e:  # keep filtering with the previously loaded list
+            logger.warning('Can\'t reload disabled thread starters: %s', e)
+
+        titles = self._titles
+        disabled = self._disabled
+
+        items = []
+        self._disabled = next_disabled = {}
+
+        for item in self._timed_pull():
+            thread_id, title = item['num'], item['comment']
+
+            if (known := titles.get(thread_id)) is not None and known[0] == title:  # the title has already been checked
+                items.append(item)
+            elif disabled.get(thread_id) == title or blocklist.is_disabled(title):
+                next_disabled[thread_id] = title
+            else:
+                items.append(item)
+
+        parsed = Thread.from_list(items, titles)  # only titles of new or edited threads are parsed
+        self._titles = {thread.id: (item['comment'], thread) for item, thread in zip(items, parsed)}
+
+        threads = tuple(sorted(parsed, key = attrgetter('rank'), reverse = True))  # ranked once per refresh for all sessions
+
+        self._snapshot = snapshot = CatalogSnapshot(threads, CatalogSnapshot.make_version(threads))
+        self._remember(snapshot)
+        self._warm.set()
+        self.backend.save_snapshot(snapshot)
+
+        return snapshot
+
+    def _remember(self, snapshot: CatalogSnapshot):
+        with self._snapshots_lock:
+            snapshots = self._snapshots
+            snapshots[snapshot.version] = snapshot
+
+            while len(snapshots) > self.history:
+                snapshots.popitem(last = False)
+
+    def _refresh_periodically(self):
+        while not self._stopped.is_set():
+            try:
+                self.refresh()
+            except Exception as e:  # keep serving the last snapshot
+                logger.warning('Can\'t refresh catalog: %s', e)
+
+            self._stopped.wait(self.refresh_interval)
+
+    def start(self):
+        if self._refresher is None:
+            self._refresher = refresher = ExecutableThread(target = self._refresh_periodically, daemon = True)
+            refresher.start()
+
+        return self
+
+    def stop(self):
+        self._stopped.set()
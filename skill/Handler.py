@@ -2,24 +2,33 @@ from __future__ import annotations
 
 import re
 from abc import ABC, abstractmethod
-from threading import Thread as ExecutableThread, RLock
-from time import sleep, time
-from dataclasses import dataclass
-from bs4 import BeautifulSoup
-
-from requests import get
-
-from much import Fetcher
+from time import perf_counter
+from operator import attrgetter
+from concurrent.futures import TimeoutError as FutureTimeoutError
 
+from . import DEFAULT_DEADLINE
 from .Thread import Thread
-from .util import normalize, normalize_spaces
-
-
-CATALOG_URL = 'https://2ch.su/b/catalog.json'
-HTTP_SUCCESS = 200
-CLEANUP_INTERVAL = 3600
-CLEANUP_TIMEOUT = 3600
-POST_ELEMENT_SEP_MARK = ' @ '
+from .Catalog import Catalog
+from .Blocklist import Blocklist
+from .Cache import LruCache
+from .Session import Session, DEFAULT_SESSION_TIMEOUT, DEFAULT_MAX_SESSIONS
+from .Backend import Backend, MemoryBackend
+from .PostStore import PostStore
+from .PostRepository import PostRepository, DEFAULT_POST_CACHE_SIZE, DEFAULT_POST_TTL
+from .Segment import SegmentIndex, POST_ELEMENT_SEP_MARK
+from .Intent import Intent, IntentRouter
+from .Metrics import Metrics
+from .Json import Template
+from .Upstream import Upstream, DEFAULT_TIMEOUT
+from .util import get_logger
+
+
+DEFAULT_SEGMENT_CACHE_SIZE = 64 * 1024 * 1024  # bytes
+DEFAULT_RENDERED_CACHE_SIZE = 32 * 1024 * 1024  # bytes
+DEFAULT_PAGE_CACHE_ENTRIES = 1024
+
+request_logger = get_logger('request')
+response_logger = get_logger('response')
 
 POST_ELEMENT_SEP_MARK_SEQUENCE_PATTERN = re.compile(r'\s+(@+\s*)+\s+')
 POST_ELEMENT_SEP_MARK_START_SEQUENCE_PATTERN = re.compile(r'^\s*(@+\s*)+\s+')
@@ -28,39 +37,41 @@ HELP_TEXT = (
     'Я могу озвучивать треды с двача. '
     'Просто назовите номер заинтересовавшего вас треда'
 )
-
-
-def cleanup_cached_post_lists(hub: UserHub):
-    cache = hub._cached_post_lists
-
-    while True:
-        current_time = time()
-
-        # print(cache)
-
-        with hub._cached_post_lists_lock:
-            items = list(cache.items())
-
-            for key, value in items:
-                if current_time - value.time > CLEANUP_TIMEOUT:
-                    cache.pop(key)
-
-        sleep(CLEANUP_INTERVAL)
-
-
-@dataclass
-class CacheEntry:
-    posts: list[str]
-    time: int
+LOADING_CATALOG_TEXT = 'Загружаю треды, скажите дальше'
+LOADING_THREAD_TEXT = 'Загружаю тред, скажите дальше'
 
 
 class UserHub(ABC):  # stateless platform-dependent methods
+    vendor = None  # namespace of the hub state in a shared backend
+    callback_text = None  # response to the callback intent
+
+    vocabulary = {
+        Intent.HELP: ('можешь', 'умеешь', 'можете', 'умеете'),
+        Intent.RESET: ('хочу', ),
+        Intent.STOP: ('стоп', ),
+        Intent.REPEAT: ('поиграем', ),
+        Intent.CONTINUE: ('дальше', 'скилл', 'skill'),
+        Intent.REWIND: ('включи', ),
+        Intent.FORWARD: ('вперед', 'вперёд'),
+        Intent.BACK: ('назад', )
+    }
+
+    ordinals = (
+        ('первый', 0), ('второй', 1), ('третий', 2), ('четвертый', 3), ('четвёртый', 3),
+        ('пятый', 4), ('шестой', 5), ('седьмой', 6), ('восьмой', 7), ('девятый', 8), ('десятый', 9)
+    )
 
     def __init__(self,
         n_threads_per_response: int = 5, n_chars_per_response = 5000,
         post_sep_length: int = 0, post_element_sep_length: int = 0,
-        timeout: int = 60, overlap: int = 2, disabled_thread_starters: tuple[str] = None,
-        n_chars_per_overlap_post: int = None
+        timeout: float = DEFAULT_TIMEOUT, overlap: int = 2, disabled_thread_starters: tuple[str] = None,
+        n_chars_per_overlap_post: int = None, catalog: Catalog = None,
+        post_cache_size: int = DEFAULT_POST_CACHE_SIZE, post_cache_entries: int = None,
+        session_timeout: float = DEFAULT_SESSION_TIMEOUT, max_sessions: int = DEFAULT_MAX_SESSIONS, backend: Backend = None,
+        post_store: PostStore = None, metrics: Metrics = None, upstream: Upstream = None, post_ttl: float = DEFAULT_POST_TTL,
+        posts: PostRepository = None, segment_cache_size: int = DEFAULT_SEGMENT_CACHE_SIZE, segment_cache_entries: int = None,
+        rendered_cache_size: int = DEFAULT_RENDERED_CACHE_SIZE, page_cache_entries: int = DEFAULT_PAGE_CACHE_ENTRIES,
+        deadline: float = DEFAULT_DEADLINE
     ):
         self.n_threads_per_response = n_threads_per_response
         self.n_chars_per_response = n_chars_per_response
@@ -69,16 +80,24 @@ class UserHub(ABC):  # stateless platform-dependent methods
         self.post_element_sep_length = post_element_sep_length
         self.timeout = timeout
         self.overlap = overlap
-
-        self._fetcher = Fetcher()
-        self._users = None
-        self._cached_post_lists = {}  # None
-        # self._cached_post_lists = {'foo': CacheEntry(['bar', 'baz'], time())}
-        self._cached_post_lists_lock = RLock()
+        self.deadline = deadline  # None to wait for the catalog and threads as long as it takes
+
+        self.upstream = upstream = Upstream(timeout = timeout) if upstream is None else upstream
+        self.metrics = Metrics() if metrics is None else metrics
+        self.backend = backend = MemoryBackend() if backend is None else backend
+        self._sessions = backend.make_session_store(self.vendor, session_timeout, max_sessions)
+        self.posts = PostRepository(
+            upstream, self.metrics, backend, post_store, post_cache_size, post_cache_entries, post_ttl
+        ) if posts is None else posts  # normalized posts are shared by all hubs, only fixing and segmentation depend on the vendor
+        self._segments = LruCache(max_entries = segment_cache_entries, max_size = segment_cache_size, sizeof = attrgetter('size'))
+        self._rendered = LruCache(max_size = rendered_cache_size, sizeof = lambda entry: entry[0].size)  # (thread id, version, distance) or (None, snapshot version, offset) -> (template, length)
+        self._pages = LruCache(max_entries = page_cache_entries)  # (catalog snapshot version, offset) -> thread headers
+        self.router = IntentRouter(self.vocabulary, self.ordinals)
+        self._templates = {}  # (text, interactive) -> template of the constant response
         self.disabled_thread_starters = disabled_thread_starters
-
-        self.cleanup_thread = cleanup_thread = ExecutableThread(target = cleanup_cached_post_lists, args = (self, ))
-        cleanup_thread.start()
+        self.catalog = Catalog(
+            Blocklist(() if disabled_thread_starters is None else disabled_thread_starters), backend = backend, metrics = self.metrics, upstream = upstream
+        ) if catalog is None else catalog
 
     def fix(self, post: str):
         return POST_ELEMENT_SEP_MARK_START_SEQUENCE_PATTERN.sub(
@@ -90,136 +109,168 @@ class UserHub(ABC):  # stateless platform-dependent methods
         )
 
     def handle(self, request: dict):
+        start = perf_counter()
         user_id = self.get_user_id(request)
 
-        if self._users is None:
-            handler = Handler(self)
-            self._users = {user_id: handler}
-        elif (handler := self._users.get(user_id)) is None:
-            handler = Handler(self)
-            self._users[user_id] = handler
+        if user_id is None or (session := self._sessions.get(user_id)) is None:  # sessions of anonymous users are not kept
+            session = Session()
+
+        handler = Handler(self, session)
+
+        try:
+            response = handler.handle(request)
+        except Exception:
+            self.metrics.request_failures.inc(self.vendor, handler.intent)
+            raise
+
+        if user_id is not None:
+            self._sessions.put(user_id, session)
+
+        if handler.interim:
+            self.metrics.interim_responses.inc(self.vendor, handler.intent)
+
+        self.metrics.request_duration.observe(perf_counter() - start, self.vendor, handler.intent)
+
+        return response
+
+    def observe_response_length(self, length: int):
+        self.metrics.response_budget.observe(length / self.n_chars_per_response, self.vendor)
+
+    @property
+    def n_sessions(self):
+        return len(self._sessions)
+
+    def get_segments(self, thread: Thread, version: float = None, timeout: float = None):  # segments of the given version of the post list if it is still kept and the version
+        post_list = self.posts.get(thread, version, timeout)
+
+        return self._get_segment_index(thread.id, post_list.time, post_list.posts), post_list.time
+
+    def get_first_segment(self, thread: Thread, timeout: float = None):  # posts of a thread which is being ingested are packed as soon as there are enough of them
+        posts, version = self.posts.stream(thread, timeout)
+
+        if not isinstance(posts, list):
+            head = []
+            n_chars = 0
+
+            for post in posts:
+                head.append(post)
+                n_chars += len(self.fix(post))
+
+                if n_chars >= self.n_chars_per_response:  # the rest of the thread can't get into the first segment
+                    return SegmentIndex(head, self).get(), version
+
+            posts = head  # the whole thread has been ingested meanwhile
+
+        return self._get_segment_index(thread.id, version, posts).get(), version
+
+    def _get_segment_index(self, thread_id: int, version: float, posts: list[str]):
+        key = (thread_id, version)
+
+        if (segments := self._segments.get(key)) is None:  # posts are fixed for the vendor once per version of the post list
+            self._segments.put(key, segments := SegmentIndex(posts, self))
 
-        return handler.handle(request)
+        return segments
 
-    def get_posts(self, thread: Thread):
-        thread_id = thread.id
+    @property
+    def segment_cache_stats(self):
+        return self._segments.stats
+
+    @property
+    def rendered_cache_stats(self):
+        return self._rendered.stats
+
+    @property
+    def page_cache_stats(self):
+        return self._pages.stats
 
-        with self._cached_post_lists_lock:
-            if (cached_post_lists := self._cached_post_lists) is not None and (cached_posts := cached_post_lists.get(thread_id)) is not None:
-                all_posts = cached_posts.posts
+    def get_page(self, version: int, threads: tuple[Thread], offset: int):  # headers of the threads listed from the offset, built once per catalog snapshot
+        key = (version, offset)
+
+        if (page := self._pages.get(key)) is None:  # pages of the previous snapshots are evicted as they get old
+            self._pages.put(key, page := self._make_page(threads, offset))
+
+        return page
+
+    def _make_page(self, threads: tuple[Thread], offset: int):
+        thread_headers_len = 0
+        thread_headers = []
+
+        # for i in range(offset, offset + self.n_threads_per_response):
+        for i in range(self.n_threads_per_response):
+            next_thread = f'Тред номер {i + 1}. {threads[offset + i].normalized_title}.'
+            thread_headers_len += len(next_thread)
+
+            # print(thread_headers_len, len(thread_headers), len(' '.join(thread_headers).split(POST_ELEMENT_SEP_MARK)) - 1, self.post_sep_length, self.post_element_sep_length)
+
+            if (
+                thread_headers_len +
+                self.post_sep_length * len(thread_headers) +
+                self.post_element_sep_length * (len(' '.join([*thread_headers, next_thread]).split(POST_ELEMENT_SEP_MARK)) - 1)
+            ) < self.n_chars_per_response:
+                thread_headers.append(next_thread)
             else:
-                # all_posts = [normalize(thread.title_text)]
-                all_posts = []
+                if len(thread_headers) < 1:
+                    next_thread = next_thread[:self.n_chars_per_response]
+                    next_thread = next_thread[:-(self.post_element_sep_length * (len(next_thread.split(POST_ELEMENT_SEP_MARK)) - 1))]
 
-                for topic in self._fetcher.fetch(thread.link, verbose = True):
-                    all_posts.append(normalize(topic.title))
+                    thread_headers.append(next_thread)
+                # elif len(top_posts) > 1:
+                #     top_posts = top_posts[:-1]
 
-                    for post in topic.comments:
-                        all_posts.append(normalize(post))
+                break
 
-                # [
-                #     normalize(post)
-                #     for topic in self._fetcher.fetch(thread.link, verbose = True)
-                #     for post in topic.comments
-                # ]
+            # if len(thread_headers) > 0:
+            #     # if thread_headers_len + len(next_thread) > self.n_chars_per_response:
+            #     if (
+            #         thread_headers_len +
+            #         self.post_sep_length * (len(thread_headers) - 1) +
+            #         self.post_element_sep_length * (len(' '.join(thread_headers).split(POST_ELEMENT_SEP_MARK)) - 1)
+            #     ) > self.n_chars_per_response:
+            #         break
+            # elif len(next_thread) > self.n_chars_per_response:
+            #     next_thread = next_thread[:self.n_chars_per_response]
+            #     next_thread = next_thread[:-(self.post_element_sep_length * (len(next_thread.split(POST_ELEMENT_SEP_MARK)) - 1))]
 
-                # print(all_posts)
+            # thread_headers.append(next_thread)
+            # thread_headers_len += len(next_thread)
 
-                if self._cached_post_lists is None:
-                    self._cached_post_lists = {thread_id: CacheEntry(all_posts, time())}
-                else:
-                    self._cached_post_lists[thread_id] = CacheEntry(all_posts, time())
-
-        return all_posts
-
-    def list_threads(self, reverse: bool = True, skip_first_n: int = 0):
-        response = get(CATALOG_URL, timeout = self.timeout)
-
-        # print(response.content)
-
-        if (status_code := response.status_code) != HTTP_SUCCESS:
-            raise ValueError(f'Can\'t pull threads, response status code is {status_code}')
-
-        # print(
-        #     len([
-        #         normalize_spaces(BeautifulSoup(thread['comment'], 'lxml').get_text().strip())
-        #         for thread in response.json()['threads']
-        #         if any(
-        #             normalize_spaces(BeautifulSoup(thread['comment'], 'lxml').get_text().lower().strip()).startswith(disabled_thread_starter)
-        #             for disabled_thread_starter in self.disabled_thread_starters
-        #         )
-        #     ])
-        # )
-
-        return sorted(
-            Thread.from_list(
-                [
-                    thread
-                    for thread in response.json()['threads']
-                    if not any(
-                        normalize_spaces(BeautifulSoup(thread['comment'], 'lxml').get_text().lower().strip()).startswith(disabled_thread_starter)
-                        for disabled_thread_starter in self.disabled_thread_starters
-                    )
-                ]
-            ),
-            key = lambda thread: (thread.length, thread.freshness),
-            reverse = reverse
-        )[skip_first_n:]
-
-    def should_reset_threads(self, utterance: str):
-        return 'хочу' in utterance
-
-    def should_stop(self, utterance: str):
-        return 'стоп' in utterance
-
-    def should_continue(self, utterance: str):
-        # print(utterance)
-        return 'дальше' in utterance or 'скилл' in utterance or 'skill' in utterance
-
-    def should_rewind(self, utterance: str):
-        # print(utterance)
-        return 'включи' in utterance
-
-    def should_go_forward(self, utterance: str):
-        return 'вперед' in utterance or 'вперёд' in utterance
-
-    def should_go_back(self, utterance: str):
-        return 'назад' in utterance
-
-    def should_repeat(self, utterance: str):
-        return 'поиграем' in utterance
-
-    def should_help(self, utterance: str):
-        return 'можешь' in utterance or 'умеешь' in utterance or 'можете' in utterance or 'умеете' in utterance
-
-    def infer_index(self, utterance: str):
-        if 'первый' in utterance:
-            return 0
-        if 'второй' in utterance:
-            return 1
-        if 'третий' in utterance:
-            return 2
-        if 'четвертый' in utterance or 'четвёртый' in utterance:
-            return 3
-        if 'пятый' in utterance:
-            return 4
-        if 'шестой' in utterance:
-            return 5
-        if 'седьмой' in utterance:
-            return 6
-        if 'восьмой' in utterance:
-            return 7
-        if 'девятый' in utterance:
-            return 8
-        if 'десятый' in utterance:
-            return 9
+        return tuple(thread_headers)
 
-        return None
+    def make_constant_response(self, request: dict, text: str, interactive: bool = True):  # same as make_response, but the body is serialized once
+        key = (text, interactive)
+
+        if (template := self._templates.get(key)) is None:
+            self._templates[key] = template = self.make_template(
+                lambda template_request: self.make_response(template_request, text, interactive = interactive)  # reports the length itself
+            )
+        else:
+            response_logger.info('Response length (text) is %d', len(text))
+            self.observe_response_length(len(text))
+
+        return self.render_template(template, request)
+
+    def segment_to_response(self, request: dict, posts: list[str], key: tuple):  # same as posts_to_response, but a segment read by many users is serialized once
+        if (entry := self._rendered.get(key)) is None:
+            template = self.make_template(lambda template_request: self.posts_to_response(template_request, list(posts)))  # reports the length itself
+            self._rendered.put(key, entry := (template, self.get_response_length(posts)))
+        else:
+            response_logger.info('Response length is %d', entry[1])
+            self.observe_response_length(entry[1])
+
+        return self.render_template(entry[0], request)
 
     @abstractmethod
     def make_response(self, request: dict, text: str = None, ssml: str = None, interactive: bool = True):
         pass
 
+    @abstractmethod
+    def make_template(self, make_body) -> Template:  # make_body returns the response to a request with placeholders in place of the variable fields
+        pass
+
+    @abstractmethod
+    def render_template(self, template: Template, request: dict):
+        pass
+
     @abstractmethod
     def get_utterance(self, request: dict):
         pass
@@ -232,19 +283,23 @@ class UserHub(ABC):  # stateless platform-dependent methods
     def posts_to_response(self, request: dict, posts: list[str]):
         pass
 
+    @abstractmethod
+    def get_response_length(self, posts: list[str]):  # length which posts_to_response reports for the given posts
+        pass
+
 
 class Handler:  # stateful platform-independent methods
 
-    def __init__(self, hub: UserHub):
+    def __init__(self, hub: UserHub, session: Session = None):
         self._hub = hub
+        self._session = session = Session() if session is None else session
+        self.intent = None  # the intent which has been handled
+        self.interim = False  # loading took longer than the deadline, so the response asks to try again
+        self._deadline = None if hub.deadline is None else perf_counter() + hub.deadline
+        self._segment = None  # (thread id, version, distance) of the last requested segment
 
-        self._last_batch_size = None  # number of threads shown in the last message
-        self._threads = None  # thread headers
-        self._offset = 0  # number of threads to skip when showing next thread to user
-
-        self._index = 0  # index of the next thread to show to user
-        self._distance = 0  # number of posts to skip when showing current thread to user in the next response
-        self._last_distance = 0  # number of posts to skip which was used in the last response
+        # thread headers, None if the session is new or the snapshot it refers to is gone
+        self._threads = None if session.snapshot is None or (snapshot := hub.catalog.get(session.snapshot)) is None else snapshot.threads
 
     @property
     def n_threads(self):
@@ -253,231 +308,177 @@ class Handler:  # stateful platform-independent methods
 
         return len(self._threads)
 
-    def infer_index(self, utterance: str):
-        index = self._hub.infer_index(utterance)
-
-        # print(index, index is not None, (last_batch_size := self._last_batch_size) is not None, last_batch_size)
+    def check_index(self, index: int):  # None if the index doesn't point to a listed thread
+        # print(index, index is not None, (last_batch_size := self._session.last_batch_size) is not None, last_batch_size)
 
         if (
             index is not None and
-            (last_batch_size := self._last_batch_size) is not None and
+            (last_batch_size := self._session.last_batch_size) is not None and
             index < last_batch_size
         ):
             return index
 
         return None
 
-    def get_posts(self, index: int, distance: int = None):
+    @property
+    def time_left(self):  # seconds until the deadline
+        return None if self._deadline is None else max(self._deadline - perf_counter(), 0)
+
+    def get_posts(self, index: int, distance: int = None):  # a thread is read from the beginning in its latest version and continued in the same version
         if (threads := self._threads) is None:
             raise ValueError('Threads are not initialized')
 
-        hub = self._hub
-
-        posts = hub.get_posts(threads[index])
-        overlap = hub.overlap
-        n_chars_per_overlap_post = hub.n_chars_per_overlap_post
+        thread = threads[index]
 
-        post_sep_length = hub.post_sep_length
-        post_element_sep_length = hub.post_element_sep_length
-
-        # print(self._hub.overlap)
-
-        if distance is not None:
-            # print('distance:', distance)
-
-            if distance >= len(posts):
-                return None, None
-
-            posts = posts[max(0, distance - overlap):]
-
-            if n_chars_per_overlap_post is None:
-                shift = 0  # skip n posts in the beginning if they are too large to not to stuck with them
-
-                while sum(len(post) for post in posts[shift:overlap]) > hub.n_chars_per_response:
-                    shift += 1
-
-                posts = posts[shift:]
-            else:
-                for i in range(overlap):
-                    posts[i] = posts[i][:n_chars_per_overlap_post]
+        if distance is None:  # a fresh pick doesn't wait for the whole thread to be ingested
+            segment, self._session.posts_version = self._hub.get_first_segment(thread, self.time_left)
+        else:
+            segments, self._session.posts_version = self._hub.get_segments(thread, self._session.posts_version, self.time_left)
+            segment = segments.get(distance)
 
-        # if distance is None:
-        #     for post, i in enumerate(posts):
-        #         print(post, i)
+        self._segment = (thread.id, self._session.posts_version, distance)
 
-        n_chars = 0
-        top_posts = []
+        return segment
 
-        for post in posts:
-            post = hub.fix(post)
+    def segment_to_response(self, request: dict, posts: list[str]):  # posts of the last requested segment
+        return self._hub.segment_to_response(request, posts, self._segment)
 
-            n_chars += len(post)
+    def read_thread(self, request: dict, item: int):  # the first segment of the thread
+        self._session.loading = True  # stays set if the thread isn't loaded in time
+        posts, distance = self.get_posts(item)
+        self._session.loading = False
 
-            # print(n_chars, self._hub.n_chars_per_response)
-            # print(n_chars, self._hub.n_chars_per_response + self._hub.post_sep_length * len(top_posts))
-            # print(n_chars, len(top_posts), len(' '.join(top_posts).split(POST_ELEMENT_SEP_MARK)) - 1, post_sep_length, post_element_sep_length)
+        if distance is not None:
+            self._session.last_distance = 0
+            self._session.distance = distance
 
-            if (
-                n_chars +
-                post_sep_length * len(top_posts) +
-                post_element_sep_length * (len(' '.join([*top_posts, post]).split(POST_ELEMENT_SEP_MARK)) - 1)
-            ) < self._hub.n_chars_per_response:
-                top_posts.append(post)
-            else:
-                if len(top_posts) <= overlap:
-                    post = post[:self._hub.n_chars_per_response - sum(len(top_post) for top_post in top_posts)]
+        return self.segment_to_response(request, posts)
 
-                    sep_mark_fix = post_element_sep_length * (len(post.split(POST_ELEMENT_SEP_MARK)) - 1)
-                    if sep_mark_fix > 0:
-                        post = post[:-(post_element_sep_length * (len(post.split(POST_ELEMENT_SEP_MARK)) - 1))]
+    def handle(self, request: dict):
+        try:
+            return self._handle(request)
+        except FutureTimeoutError:  # the thread keeps loading in background, the next utterance gets it from cache
+            self.interim = True
+            return self._hub.make_constant_response(request, LOADING_THREAD_TEXT)
 
-                    top_posts.append(post)
+    def _handle(self, request: dict):
+        utterance = self._hub.get_utterance(request).lower().strip()
 
-                # elif len(top_posts) > 1:
-                #     top_posts = top_posts[:-1]
+        request_logger.info('Got utterance "%s"', utterance)
 
-                break
+        intents, index = self._hub.router.classify(utterance)
 
-        return top_posts, (0 if distance is None else distance) + len(top_posts) - 1 - (0 if distance is None else self._hub.overlap)
+        if Intent.CALLBACK in intents:
+            self.intent = Intent.CALLBACK
+            return self._hub.make_constant_response(request, self._hub.callback_text)
 
-    def handle(self, request: dict):
-        utterance = self._hub.get_utterance(request).lower().strip()
+        if Intent.HELP in intents:
+            self.intent = Intent.HELP
+            return self._hub.make_constant_response(request, HELP_TEXT)
 
-        print(f'Got utterance "{utterance}"')
+        threads = self._threads
 
-        if self._hub.should_help(utterance):
-            return self._hub.make_response(request, HELP_TEXT)
+        if threads is None or Intent.RESET in intents:
+            self.intent = Intent.RESET if Intent.RESET in intents else Intent.LIST
 
-        threads = self._threads
+            if (snapshot := self._hub.catalog.get_snapshot(self.time_left)) is None:  # the catalog keeps loading in background, the next utterance lists its threads
+                self.interim = True
+                return self._hub.make_constant_response(request, LOADING_CATALOG_TEXT)
 
-        if threads is None or self._hub.should_reset_threads(utterance):
-            self._threads = threads = self._hub.list_threads()
-            self._offset = 0
+            self._threads = threads = snapshot.threads
+            self._session.snapshot = snapshot.version
+            self._session.offset = 0
+            self._session.loading = False
         else:
-            if self._hub.should_stop(utterance):
-                return self._hub.make_response(request, 'Завершаю показ тредов', interactive = False)
+            if Intent.STOP in intents:
+                self.intent = Intent.STOP
+                return self._hub.make_constant_response(request, 'Завершаю показ тредов', interactive = False)
 
-            if self._hub.should_repeat(utterance):
-                posts, _ = self.get_posts(self._offset + self._index, self._last_distance + 1)
+            if self._session.loading and self._session.index is not None and (Intent.CONTINUE in intents or Intent.REPEAT in intents):
+                self.intent = Intent.PICK  # the thread which was picked before it had been loaded
+                return self.read_thread(request, self._session.offset + self._session.index)
+
+            if Intent.REPEAT in intents:
+                self.intent = Intent.REPEAT
+                posts, _ = self.get_posts(self._session.offset + self._session.index, self._session.last_distance + 1)
 
                 if posts is None:
-                    return self._hub.make_response(request, 'Больше не осталось комментариев')
+                    return self._hub.make_constant_response(request, 'Больше не осталось комментариев')
 
-                return self._hub.posts_to_response(request, posts)
+                return self.segment_to_response(request, posts)
 
-            # print(self._hub.should_continue(utterance), self._index, self._distance)
-            if self._hub.should_continue(utterance) and self._index is not None and self._distance is not None:
-                posts, distance = self.get_posts(self._offset + self._index, self._distance + 1)
+            # print(Intent.CONTINUE in intents, self._session.index, self._session.distance)
+            if Intent.CONTINUE in intents and self._session.index is not None and self._session.distance is not None:
+                self.intent = Intent.CONTINUE
+                posts, distance = self.get_posts(self._session.offset + self._session.index, self._session.distance + 1)
 
-                # print(f'current distance = {self._distance}, next distance = {distance}')
+                # print(f'current distance = {self._session.distance}, next distance = {distance}')
 
                 if posts is None or distance is None:
-                    return self._hub.make_response(request, 'Больше не осталось комментариев')
+                    return self._hub.make_constant_response(request, 'Больше не осталось комментариев')
 
-                self._last_distance = self._distance
-                self._distance = distance
+                self._session.last_distance = self._session.distance
+                self._session.distance = distance
 
-                return self._hub.posts_to_response(request, posts)
+                return self.segment_to_response(request, posts)
 
-            if self._hub.should_rewind(utterance) and self._index is not None and self._distance is not None:
-                # print('foo', self._offset + self._index, max(self._distance - 1, 0))
-                posts, distance = self.get_posts(self._offset + self._index, max(self._distance - 1, 0))
+            if Intent.REWIND in intents and self._session.index is not None and self._session.distance is not None:
+                self.intent = Intent.REWIND
+                # print('foo', self._session.offset + self._session.index, max(self._session.distance - 1, 0))
+                posts, distance = self.get_posts(self._session.offset + self._session.index, max(self._session.distance - 1, 0))
 
                 if posts is None or distance is None:
-                    return self._hub.make_response(request, 'Больше не осталось комментариев')
+                    return self._hub.make_constant_response(request, 'Больше не осталось комментариев')
 
-                self._last_distance = self._distance
-                self._distance = distance
+                self._session.last_distance = self._session.distance
+                self._session.distance = distance
 
-                return self._hub.posts_to_response(request, posts)
+                return self.segment_to_response(request, posts)
 
-            if self._hub.should_go_forward(utterance):
-                self._distance = 0
-                self._last_distance = 0
+            if Intent.FORWARD in intents:
+                self.intent = Intent.FORWARD
+                self._session.distance = 0
+                self._session.last_distance = 0
 
-                current_index = self._index
+                current_index = self._session.index
 
                 if current_index is None:
                     index = 0
                 else:
-                    index = min(current_index + 1, self.n_threads - self._offset - 1)
+                    index = min(current_index + 1, self.n_threads - self._session.offset - 1)
 
-                    if index >= self._last_batch_size:
-                        self._last_batch_size += 1
-            elif self._hub.should_go_back(utterance):
-                self._distance = 0
-                self._last_distance = 0
+                    if index >= self._session.last_batch_size:
+                        self._session.last_batch_size += 1
+            elif Intent.BACK in intents:
+                self.intent = Intent.BACK
+                self._session.distance = 0
+                self._session.last_distance = 0
 
-                current_index = self._index
+                current_index = self._session.index
 
                 if current_index is None:
                     index = 0
                 else:
-                    index = max(current_index - 1, -self._offset)
+                    index = max(current_index - 1, -self._session.offset)
             else:
-                index = self.infer_index(utterance)
+                index = self.check_index(index)
+                self.intent = Intent.LIST if index is None else Intent.PICK
 
-            self._index = index
+            self._session.index = index
 
             if index is None:
                 target_item = None
-                self._offset = min(self.n_threads - self._hub.n_threads_per_response, self._offset + self._last_batch_size)
+                self._session.offset = min(self.n_threads - self._hub.n_threads_per_response, self._session.offset + self._session.last_batch_size)
             else:
-                target_item = self._offset + index
+                target_item = self._session.offset + index
 
             if target_item is not None:
-                posts, distance = self.get_posts(target_item)
-
-                if distance is not None:
-                    self._last_distance = 0
-                    self._distance = distance
-
-                return self._hub.posts_to_response(request, posts)
-
-        thread_headers_len = 0
-        thread_headers = []
-        offset = self._offset
-        threads = self._threads
-
-        # for i in range(offset, offset + self._hub.n_threads_per_response):
-        for i in range(self._hub.n_threads_per_response):
-            next_thread = f'Тред номер {i + 1}. {normalize(threads[offset + i].title_text)}.'
-            thread_headers_len += len(next_thread)
-
-            # print(thread_headers_len, len(thread_headers), len(' '.join(thread_headers).split(POST_ELEMENT_SEP_MARK)) - 1, self._hub.post_sep_length, self._hub.post_element_sep_length)
-
-            if (
-                thread_headers_len +
-                self._hub.post_sep_length * len(thread_headers) +
-                self._hub.post_element_sep_length * (len(' '.join([*thread_headers, next_thread]).split(POST_ELEMENT_SEP_MARK)) - 1)
-            ) < self._hub.n_chars_per_response:
-                thread_headers.append(next_thread)
-            else:
-                if len(thread_headers) < 1:
-                    next_thread = next_thread[:self._hub.n_chars_per_response]
-                    next_thread = next_thread[:-(self._hub.post_element_sep_length * (len(next_thread.split(POST_ELEMENT_SEP_MARK)) - 1))]
+                return self.read_thread(request, target_item)
 
-                    thread_headers.append(next_thread)
-                # elif len(top_posts) > 1:
-                #     top_posts = top_posts[:-1]
-
-                break
-
-            # if len(thread_headers) > 0:
-            #     # if thread_headers_len + len(next_thread) > self._hub.n_chars_per_response:
-            #     if (
-            #         thread_headers_len +
-            #         self._hub.post_sep_length * (len(thread_headers) - 1) +
-            #         self._hub.post_element_sep_length * (len(' '.join(thread_headers).split(POST_ELEMENT_SEP_MARK)) - 1)
-            #     ) > self._hub.n_chars_per_response:
-            #         break
-            # elif len(next_thread) > self._hub.n_chars_per_response:
-            #     next_thread = next_thread[:self._hub.n_chars_per_response]
-            #     next_thread = next_thread[:-(self._hub.post_element_sep_length * (len(next_thread.split(POST_ELEMENT_SEP_MARK)) - 1))]
-
-            # thread_headers.append(next_thread)
-            # thread_headers_len += len(next_thread)
+        version = self._session.snapshot
+        offset = self._session.offset
+        thread_headers = self._hub.get_page(version, self._threads, offset)
 
-        self._last_batch_size = len(thread_headers)
+        self._session.last_batch_size = len(thread_headers)
 
-        return self._hub.posts_to_response(request, thread_headers)
+        return self._hub.segment_to_response(request, thread_headers, (None, version, offset))
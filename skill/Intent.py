@@ -0,0 +1,74 @@
+import re
+
+from .util import PrefixTrie
+
+
+NO_INTENTS = frozenset()
+
+
+class Intent:  # what the user asks for, an utterance may mention several intents at once
+    HELP = 'help'
+    RESET = 'reset'
+    STOP = 'stop'
+    REPEAT = 'repeat'
+    CONTINUE = 'continue'
+    REWIND = 'rewind'
+    FORWARD = 'forward'
+    BACK = 'back'
+    CALLBACK = 'callback'
+    PICK = 'pick'  # there are no keywords for the following intents, they are what is left when nothing else is mentioned
+    LIST = 'list'
+
+
+class IntentRouter:  # vocabulary of a hub compiled into a single pattern which finds all keywords of an utterance in one pass
+
+    def __init__(self, vocabulary: dict[str, tuple[str]], ordinals: tuple[tuple[str, int]] = ()):  # ordinals are (keyword, thread index) pairs, the first mentioned pair wins
+        words = {}  # keyword -> (intents, priority of the ordinal)
+
+        for intent, keywords in vocabulary.items():
+            for keyword in keywords:
+                intents, priority = words.get(keyword, (NO_INTENTS, None))
+                words[keyword] = (intents | {intent}, priority)
+
+        for priority, (keyword, _) in enumerate(ordinals):
+            intents, current_priority = words.get(keyword, (NO_INTENTS, None))
+            words[keyword] = (intents, priority if current_priority is None else min(priority, current_priority))
+
+        self._indices = tuple(index for _, index in ordinals)
+        self._words = {keyword: self._merge_prefixes(words, keyword) for keyword in words if keyword}
+
+        # the lookahead allows keywords to overlap, only the longest keyword starting at each position is captured
+        self._pattern = re.compile(f'(?=({PrefixTrie(self._words).to_pattern()}))')
+
+    @staticmethod
+    def _merge_prefixes(words: dict, keyword: str):  # keywords which are prefixes of the captured one are mentioned as well
+        intents = NO_INTENTS
+        priority = None
+
+        for i in range(1, len(keyword) + 1):
+            if (word := words.get(keyword[:i])) is not None:
+                word_intents, word_priority = word
+
+                intents |= word_intents
+
+                if word_priority is not None and (priority is None or word_priority < priority):
+                    priority = word_priority
+
+        return intents, priority
+
+    def classify(self, utterance: str):  # intents mentioned in the utterance and the thread index or None
+        words = self._words
+
+        intents = NO_INTENTS
+        priority = None
+
+        for keyword in self._pattern.findall(utterance):
+            word_intents, word_priority = words[keyword]
+
+            if word_intents:
+                intents = word_intents if not intents else intents | word_intents
+
+            if word_priority is not None and (priority is None or word_priority < priority):
+                priority = word_priority
+
+        return intents, None if priority is None else self._indices[priority]
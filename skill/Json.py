@@ -0,0 +1,102 @@
+import json
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library is used if it is not installed
+    orjson = None
+
+
+MIMETYPE = 'application/json'
+SEPARATORS = (',', ':')
+
+
+def dump(value):  # compact utf-8 encoded json
+    if orjson is None:
+        return json.dumps(value, ensure_ascii = False, separators = SEPARATORS).encode()
+
+    return orjson.dumps(value)
+
+
+def load(value: str | bytes):
+    if orjson is None:
+        return json.loads(value)
+
+    return orjson.loads(value)
+
+
+def placeholder(name: str):  # value which marks a variable field in the body of a template
+    return f'\x00{name}\x00'
+
+
+class RawJson(bytes):  # response body which is already serialized
+    pass
+
+
+class JsonProvider(JSONProvider):  # compact output without escaping non-ascii characters and sorting keys
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('ensure_ascii', False)
+            kwargs.setdefault('separators', SEPARATORS)
+
+            return json.dumps(obj, **kwargs)
+
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s: str | bytes, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        return self._app.response_class(dump(self._prepare_response_obj(args, kwargs)), mimetype = MIMETYPE)
+
+
+class Template:  # json object which is serialized once, only values of the variable fields are serialized on every render
+
+    def __init__(self, body: dict, fields: tuple[str] = (), optional_fields: tuple[str] = ()):
+        # fields are marked with placeholders in the body, optional fields are appended to the top-level object unless they are None
+        serialized = dump(body)
+        markers = {field: dump(placeholder(field)) for field in fields}
+
+        chunks = []
+        names = []
+        start = 0
+
+        for position, field in sorted((serialized.index(marker), field) for field, marker in markers.items()):
+            chunks.append(serialized[start:position])
+            names.append(field)
+
+            start = position + len(markers[field])
+
+        chunks.append(serialized[start:] if len(optional_fields) < 1 else serialized[start:-1])  # optional fields go before the closing brace
+
+        self.fields = tuple(names)
+        self.optional_fields = tuple((field, b',' + dump(field) + b':') for field in optional_fields)
+
+        self._chunks = chunks
+
+    @property
+    def size(self):  # number of bytes of the serialized constant parts
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def render(self, **values):
+        chunks = self._chunks
+        parts = [chunks[0]]
+
+        for field, chunk in zip(self.fields, chunks[1:]):
+            parts.append(dump(values.get(field)))
+            parts.append(chunk)
+
+        if optional_fields := self.optional_fields:
+            for field, prefix in optional_fields:
+                if (value := values.get(field)) is not None:
+                    parts.append(prefix)
+                    parts.append(dump(value))
+
+            parts.append(b'}')
+
+        return RawJson(b''.join(parts))
@@ -0,0 +1,134 @@
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)  # seconds
+BUDGET_BUCKETS = (0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1, 1.25, 1.5)  # fractions of the response length limit
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: tuple[str], values: tuple, extra: str = None):
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+
+    if extra is not None:
+        labels.append(extra)
+
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def _format_value(value: float):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+
+    def __init__(self, name: str, description: str, labels: tuple[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+        self._lock = Lock()
+
+    def render(self):
+        return '\n'.join([f'# HELP {self.name} {self.description}', f'# TYPE {self.name} {self.type}', *self._render_samples()])
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._values = defaultdict(int)
+
+    def inc(self, *labels, amount: int = 1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def _render_samples(self):
+        with self._lock:
+            values = list(self._values.items())
+
+        return [f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}' for labels, value in values]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, *args, buckets: tuple[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.buckets = buckets
+
+        self._values = {}  # labels -> [counts per bucket (the last one is +Inf), sum]
+
+    def observe(self, value: float, *labels):
+        bucket = bisect_left(self.buckets, value)  # bucket upper bounds are inclusive
+
+        with self._lock:
+            if (state := self._values.get(labels)) is None:
+                self._values[labels] = state = [[0] * (len(self.buckets) + 1), 0]
+
+            state[0][bucket] += 1
+            state[1] += value
+
+    def _render_samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+
+        name = self.name
+        samples = []
+
+        for labels, counts, total in values:
+            n_observations = 0
+
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                n_observations += count
+                bound_label = f'le="{bound}"'
+                samples.append(f'{name}_bucket{_format_labels(self.labels, labels, bound_label)} {n_observations}')
+
+            samples.append(f'{name}_sum{_format_labels(self.labels, labels)} {_format_value(total)}')
+            samples.append(f'{name}_count{_format_labels(self.labels, labels)} {n_observations}')
+
+        return samples
+
+
+class Collected(Metric):  # values are read from their owner on every scrape instead of being tracked
+
+    def __init__(self, name: str, description: str, labels: tuple[str], collect, type_: str = 'gauge'):
+        super().__init__(name, description, labels)
+
+        self.collect = collect  # returns (labels, value) pairs
+        self.type = type_
+
+    def _render_samples(self):
+        return [f'{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}' for labels, value in self.collect()]
+
+
+class Metrics:  # in-process registry rendered in the prometheus text format, every worker process has its own
+
+    def __init__(self):
+        self.request_duration = Histogram('skill_request_duration_seconds', 'Time spent handling a request', ('vendor', 'intent'))
+        self.request_failures = Counter('skill_request_failures_total', 'Requests which raised an exception', ('vendor', 'intent'))
+        self.interim_responses = Counter('skill_interim_responses_total', 'Requests answered with an interim reply because loading took longer than the deadline', ('vendor', 'intent'))
+        self.response_budget = Histogram(
+            'skill_response_length_ratio', 'Response length relative to the limit of characters per response', ('vendor', ), buckets = BUDGET_BUCKETS
+        )
+        self.upstream_duration = Histogram('skill_upstream_duration_seconds', 'Time spent downloading the catalog and threads', ('source', ))
+        self.upstream_failures = Counter('skill_upstream_failures_total', 'Failed downloads of the catalog and threads', ('source', ))
+
+        self._metrics = [self.request_duration, self.request_failures, self.interim_responses, self.response_budget, self.upstream_duration, self.upstream_failures]
+
+    def add(self, metric: Metric):
+        self._metrics.append(metric)
+
+        return metric
+
+    def render(self):
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import logging
+from time import time, perf_counter
+from sys import getsizeof
+from operator import attrgetter
+from dataclasses import dataclass, replace
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeoutError
+from threading import Lock, Condition
+
+from .Thread import Thread
+from .Cache import LruCache
+from .Backend import Backend, MemoryBackend
+from .PostStore import PostStore
+from .Metrics import Metrics
+from .Upstream import Upstream, UpstreamError
+from .util import normalize_many, SingleFlight, get_logger
+
+
+DEFAULT_POST_CACHE_SIZE = 256 * 1024 * 1024  # bytes
+DEFAULT_POST_TTL = 300  # seconds after which cached posts of a growing thread are refreshed in background
+N_REVALIDATION_WORKERS = 2
+N_INGESTION_WORKERS = 2
+N_LOADING_WORKERS = 8  # threads loaded at once for requests which can't wait for them longer than their deadline
+INGESTION_BATCH_SIZE = 32  # posts normalized at once before readers are notified
+
+NAMESPACE = 'posts'  # posts are vendor-neutral, so all hubs share the same namespace of the backend
+
+upstream_logger = get_logger('upstream')
+
+
+@dataclass
+class PostList:
+    posts: list[str]  # normalized, but not fixed for any vendor yet
+    time: float  # when the posts were downloaded, also serves as the version of the post list
+    length: int = None  # number of posts in the thread according to the catalog at the moment of download
+    previous: PostList = None  # the version which has been replaced by this one
+
+    @property
+    def size(self):  # approximate number of bytes occupied by the posts
+        return sum(getsizeof(post) for post in self.posts) + (0 if self.previous is None else self.previous.size)
+
+
+class Ingestion:  # posts of a downloaded thread which are normalized in background, the ones which are ready can be read before the rest
+
+    def __init__(self, raw_posts: list[str], time: float):
+        self.raw_posts = raw_posts
+        self.posts = []  # normalized so far, only appended to
+        self.time = time
+        self.future = Future()  # post list which is made once all posts are normalized
+
+        self._done = False
+        self._error = None
+        self._ready = Condition()
+
+    def run(self):
+        raw_posts = self.raw_posts
+
+        try:
+            for start in range(0, len(raw_posts), INGESTION_BATCH_SIZE):
+                batch = normalize_many(raw_posts[start:start + INGESTION_BATCH_SIZE])
+
+                with self._ready:
+                    self.posts.extend(batch)
+                    self._ready.notify_all()
+        except Exception as e:  # reported to the readers as well
+            self._error = e
+            raise
+        finally:
+            with self._ready:
+                self._done = True
+                self._ready.notify_all()
+
+        return self.posts
+
+    def __iter__(self):
+        return self.iterate()
+
+    def iterate(self, timeout: float = None):  # normalized posts in order, waits for the next batch if needed, but gives up once the timeout runs out
+        deadline = None if timeout is None else perf_counter() + timeout
+        posts = self.posts
+        i = 0
+
+        while True:
+            with self._ready:
+                while i >= len(posts) and not self._done:
+                    if deadline is None:
+                        self._ready.wait()
+                    elif (remaining := deadline - perf_counter()) > 0:
+                        self._ready.wait(remaining)
+                    else:  # ingestion goes on, the posts are cached once it is done
+                        raise FutureTimeoutError('Posts are not ingested in time')
+
+                end = len(posts)
+
+            if i >= end:
+                if (error := self._error) is not None:
+                    raise error
+
+                return
+
+            yield from posts[i:end]
+
+            i = end
+
+    def result(self, timeout: float = None):
+        return self.future.result(timeout)
+
+
+class PostRepository:  # normalized posts of threads shared by all hubs, each thread is downloaded and kept once regardless of the number of vendors
+
+    def __init__(self,
+        upstream: Upstream = None, metrics: Metrics = None, backend: Backend = None, post_store: PostStore = None,
+        max_size: int = DEFAULT_POST_CACHE_SIZE, max_entries: int = None, ttl: float = DEFAULT_POST_TTL
+    ):
+        self.upstream = Upstream() if upstream is None else upstream
+        self.metrics = Metrics() if metrics is None else metrics
+        self.ttl = ttl
+
+        backend = MemoryBackend() if backend is None else backend
+
+        self._cache = LruCache(max_entries = max_entries, max_size = max_size, sizeof = attrgetter('size'))
+        self._shared_post_store = backend.make_post_store(NAMESPACE, max_size)  # posts downloaded by other workers
+        self._post_store = post_store  # posts downloaded before the last restart
+        self._loader = SingleFlight()  # concurrent requests for the same thread wait for a single download
+        self._revalidator = ThreadPoolExecutor(max_workers = N_REVALIDATION_WORKERS, thread_name_prefix = 'revalidate')
+        self._revalidating = set()  # ids of threads which are waiting for a refresh
+        self._revalidation_lock = Lock()
+        self._ingestor = ThreadPoolExecutor(max_workers = N_INGESTION_WORKERS, thread_name_prefix = 'ingest')
+        self._ingestions = {}  # thread id -> ingestion of the thread which has been downloaded, but isn't cached yet
+        self._background_loader = ThreadPoolExecutor(max_workers = N_LOADING_WORKERS, thread_name_prefix = 'load')
+
+    def get(self, thread: Thread, version: float = None, timeout: float = None):  # the given version of the post list if it is still kept, otherwise the latest one
+        # raises TimeoutError if the thread isn't loaded in time, it keeps loading in background and gets cached for the next call
+        deadline = None if timeout is None else perf_counter() + timeout
+
+        if isinstance(entry := self._get(thread, timeout), Ingestion):
+            entry = entry.result(None if deadline is None else max(deadline - perf_counter(), 0))
+
+        if version is not None and entry.time != version and (previous := entry.previous) is not None and previous.time == version:
+            return previous
+
+        return entry
+
+    def stream(self, thread: Thread, timeout: float = None):  # normalized posts of the latest version and the version, posts of a fresh download are yielded while it is ingested
+        deadline = None if timeout is None else perf_counter() + timeout
+
+        if isinstance(entry := self._get(thread, timeout), Ingestion):  # raises TimeoutError from the iterator if the next batch isn't ready in time
+            return entry.iterate(None if deadline is None else max(deadline - perf_counter(), 0)), entry.time
+
+        return entry.posts, entry.time
+
+    def _get(self, thread: Thread, timeout: float = None):
+        if (entry := self._cache.get(thread.id)) is None:  # cache lock is never held during network i/o
+            if timeout is None:
+                entry = self._loader.do(thread.id, self._load, thread)
+            else:  # the caller stops waiting after the timeout, but the download goes on
+                entry = self._loader.submit(self._background_loader, thread.id, self._load, thread).result(timeout)
+        elif self.is_stale(entry, thread):  # served right away, the next request gets the refreshed version
+            self._revalidate(thread)
+
+        return entry
+
+    @property
+    def stats(self):
+        return self._cache.stats
+
+    def is_stale(self, entry: PostList, thread: Thread):  # the thread could have got new posts since the entry was downloaded
+        return time() - entry.time > self.ttl and (entry.length is None or thread.length > entry.length)
+
+    def _load(self, thread: Thread):
+        thread_id = thread.id
+
+        if (entry := self._cache.peek(thread_id)) is not None:  # the thread could have been loaded by another caller right before
+            return entry
+
+        if (ingestion := self._ingestions.get(thread_id)) is not None:
+            return ingestion
+
+        if (shared_post_store := self._shared_post_store) is not None and (shared_entry := shared_post_store.get(thread_id)) is not None:
+            entry = PostList(*shared_entry)  # length is unknown, so the entry is revalidated once it gets old
+
+            self._cache.put(thread_id, entry)
+
+            return entry
+
+        if (post_store := self._post_store) is not None and (stored_entry := post_store.get(thread_id, thread.length)) is not None:
+            entry = PostList(*stored_entry, thread.length)
+
+            self._cache.put(thread_id, entry)
+
+            if shared_post_store is not None:
+                shared_post_store.put(thread_id, entry.posts, entry.time, entry.size)
+
+            return entry
+
+        try:
+            return self._download(thread)
+        except Exception as e:
+            if post_store is not None and (stored_entry := post_store.get(thread_id, 0)) is not None:  # serve posts which are out of date while 2ch is unavailable
+                upstream_logger.warning('Can\'t fetch thread %s, serving posts downloaded before: %s', thread.link, e)
+
+                entry = PostList(*stored_entry)
+
+                self._cache.put(thread_id, entry)
+
+                return entry
+
+            upstream_logger.warning('Can\'t fetch thread %s: %s', thread.link, e, exc_info = not isinstance(e, UpstreamError))
+            raise
+
+    def _download(self, thread: Thread, previous: PostList = None):  # posts are cached once all of them are normalized
+        thread_id = thread.id
+        all_posts = []
+        start = perf_counter()
+
+        try:
+            topics = self.upstream.fetch(thread.link, verbose = upstream_logger.isEnabledFor(logging.INFO))
+        except Exception:
+            self.metrics.upstream_failures.inc('thread')
+            raise
+        finally:
+            self.metrics.upstream_duration.observe(perf_counter() - start, 'thread')
+
+        for topic in topics:
+            all_posts.append(topic.title)
+            all_posts.extend(topic.comments)
+
+        self._ingestions[thread_id] = ingestion = Ingestion(all_posts, time())
+        self._ingestor.submit(self._ingest, thread, ingestion, previous)
+
+        return ingestion
+
+    def _ingest(self, thread: Thread, ingestion: Ingestion, previous: PostList = None):
+        thread_id = thread.id
+
+        try:
+            entry = PostList(
+                ingestion.run(), ingestion.time, thread.length,
+                None if previous is None else replace(previous, previous = None)  # users who are in the middle of the thread keep reading the previous version
+            )
+
+            self._cache.put(thread_id, entry)
+        except Exception as e:
+            upstream_logger.error('Can\'t ingest thread %s', thread.link, exc_info = True)
+            ingestion.future.set_exception(e)
+            return
+        finally:
+            self._ingestions.pop(thread_id, None)
+
+        ingestion.future.set_result(entry)
+
+        try:
+            if (shared_post_store := self._shared_post_store) is not None:
+                shared_post_store.put(thread_id, entry.posts, entry.time, entry.size)
+
+            if (post_store := self._post_store) is not None:
+                post_store.put(thread_id, thread.length, entry.posts, entry.time)  # posts count from the catalog tells when the thread becomes stale
+        except Exception:  # posts are still cached by this worker
+            upstream_logger.error('Can\'t store thread %s', thread.link, exc_info = True)
+
+    def _revalidate(self, thread: Thread):
+        with self._revalidation_lock:
+            if thread.id in self._revalidating:
+                return
+
+            self._revalidating.add(thread.id)
+
+        self._revalidator.submit(self._revalidate_in_background, thread)
+
+    def _revalidate_in_background(self, thread: Thread):
+        try:
+            self._loader.do(thread.id, self._revalidate_posts, thread)  # requests which miss the cache meanwhile wait for the same download
+        finally:
+            with self._revalidation_lock:
+                self._revalidating.discard(thread.id)
+
+    def _revalidate_posts(self, thread: Thread):
+        if (entry := self._cache.peek(thread.id)) is not None and not self.is_stale(entry, thread):
+            return entry
+
+        try:
+            return self._download(thread, entry).result()
+        except Exception as e:
+            if entry is None:  # evicted meanwhile, so requests which wait for the refresh get the error
+                upstream_logger.warning('Can\'t refresh thread %s: %s', thread.link, e)
+                raise
+
+            upstream_logger.warning('Can\'t refresh thread %s, serving cached posts: %s', thread.link, e)  # the stale entry is still there
+            return entry
@@ -0,0 +1,61 @@
+import json
+from time import time
+
+from .Backend import SqliteDatabase
+
+
+DEFAULT_POST_STORE_TTL = 3 * 24 * 3600  # seconds, threads which haven't been requested for this long are removed
+CLEANUP_PERIOD = 100  # number of writes between removals of expired threads
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id INTEGER PRIMARY KEY,
+    posts_count INTEGER NOT NULL,
+    posts TEXT NOT NULL,
+    time REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_accessed ON threads (accessed);
+'''
+
+
+class PostStore(SqliteDatabase):  # normalized posts which survive restarts, shared by all vendors because posts don't depend on them
+
+    def __init__(self, path: str, ttl: float = DEFAULT_POST_STORE_TTL):
+        super().__init__(path, SCHEMA)
+
+        self.ttl = ttl
+        self._n_writes = 0
+
+        self.cleanup()
+
+    def get(self, thread_id: int, posts_count: int):  # posts and the time they were downloaded at, None if the thread has grown since then
+        connection = self.connection
+
+        if (
+            row := connection.execute(
+                'SELECT posts, time FROM threads WHERE thread_id = ? AND posts_count >= ?',
+                (thread_id, posts_count)
+            ).fetchone()
+        ) is None:
+            return None
+
+        connection.execute('UPDATE threads SET accessed = ? WHERE thread_id = ?', (time(), thread_id))
+
+        posts, time_ = row
+
+        return json.loads(posts), time_
+
+    def put(self, thread_id: int, posts_count: int, posts: list[str], time_: float):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO threads (thread_id, posts_count, posts, time, accessed) VALUES (?, ?, ?, ?, ?)',
+            (thread_id, posts_count, json.dumps(posts, ensure_ascii = False), time_, time())
+        )
+
+        self._n_writes += 1
+
+        if self._n_writes % CLEANUP_PERIOD == 0:
+            self.cleanup()
+
+    def cleanup(self):
+        self.connection.execute('DELETE FROM threads WHERE accessed < ?', (time() - self.ttl, ))
@@ -1,10 +1,28 @@
 from .Handler import UserHub, POST_ELEMENT_SEP_MARK
+from .Intent import Intent
+from .util import get_logger
+from .Json import Template, placeholder
 
 POST_SEP = ' <break time="1500ms"/> '
 POST_ELEMENT_SEP = ' <break time="500ms"/> '
 
+logger = get_logger('response')
+
 
 class SberUserHub(UserHub):
+    vendor = 'sber'
+    callback_text = 'Маруся, запусти скилл оранжевая нить'
+
+    vocabulary = {  # utterances come lemmatized
+        **UserHub.vocabulary,
+        Intent.HELP: ('мочь', 'уметь'),
+        Intent.RESET: ('хотеть', ),
+        Intent.REPEAT: ('поиграть', ),
+        Intent.CONTINUE: ('далекий', 'скил', 'skill'),
+        Intent.CALLBACK: ('нужный', )
+    }
+
+    ordinals = (('10', 9), *((str(index + 1), index) for index in range(9)))  # '10' goes first because it contains '1'
 
     def __init__(self, *args, n_threads_per_response: int = 10, n_chars_per_response = 4000, **kwargs):
         super().__init__(
@@ -17,45 +35,6 @@ class SberUserHub(UserHub):
     # def fix(self, post: str):
     #     return post.replace('@', '<break time="500ms"/>')
 
-    def should_reset_threads(self, utterance: str):
-        return 'хотеть' in utterance
-
-    def should_continue(self, utterance: str):
-        return 'далекий' in utterance or 'скил' in utterance or 'skill' in utterance
-
-    def should_repeat(self, utterance: str):
-        return 'поиграть' in utterance
-
-    def should_help(self, utterance: str):
-        return 'мочь' in utterance or 'уметь' in utterance
-
-    def should_run_callback(self, utterance: str):
-        return 'нужный' in utterance
-
-    def infer_index(self, utterance: str):
-        if '10' in utterance:
-            return 9
-        if '1' in utterance:
-            return 0
-        if '2' in utterance:
-            return 1
-        if '3' in utterance:
-            return 2
-        if '4' in utterance:
-            return 3
-        if '5' in utterance:
-            return 4
-        if '6' in utterance:
-            return 5
-        if '7' in utterance:
-            return 6
-        if '8' in utterance:
-            return 7
-        if '9' in utterance:
-            return 8
-
-        return None
-
     def posts_to_response(self, request: dict, posts: list[str]):
         # preprocessed_posts = []
 
@@ -67,19 +46,27 @@ class SberUserHub(UserHub):
         # print(posts)
 
         # return self.make_response(request, '\n'.join(posts), POST_SEP.join(posts)[:self.n_chars_per_response])
-        return self.make_response(request, '\n'.join(posts), POST_SEP.join([post.replace(POST_ELEMENT_SEP_MARK, POST_ELEMENT_SEP) for post in posts]))
+        return self.make_response(request, '\n'.join(posts), self.to_ssml(posts))
+
+    def to_ssml(self, posts: list[str]):
+        return POST_SEP.join([post.replace(POST_ELEMENT_SEP_MARK, POST_ELEMENT_SEP) for post in posts])
+
+    def get_response_length(self, posts: list[str]):
+        return len(self.to_ssml(posts))
 
     def make_response(self, request: dict, text: str, ssml: str = None, interactive: bool = True):
         payload = request.get('payload', {})
 
         if ssml is None:
-            print(f'Response length (text) is {len(text)}')
+            logger.info('Response length (text) is %d', len(text))
         else:
-            print(f'Response length (ssml) is {len(ssml)}')
+            logger.info('Response length (ssml) is %d', len(ssml))
 
-        print(text, len(text))
+        self.observe_response_length(len(text if ssml is None else ssml))
+
+        logger.debug('Response text: %s', text)
         if ssml is not None:
-            print(ssml, len(ssml))
+            logger.debug('Response ssml: %s', ssml)
 
         # print()
         # print(ssml)
@@ -112,6 +99,24 @@ class SberUserHub(UserHub):
             }
         }
 
+    def make_template(self, make_body):
+        request = {
+            'sessionId': placeholder('sessionId'),
+            'messageId': placeholder('messageId'),
+            'uuid': placeholder('uuid'),
+            'payload': {'device': placeholder('device')}
+        }
+
+        return Template(make_body(request), fields = ('sessionId', 'messageId', 'uuid', 'device'))
+
+    def render_template(self, template: Template, request: dict):
+        return template.render(
+            sessionId = request.get('sessionId'),
+            messageId = request.get('messageId'),
+            uuid = request.get('uuid'),
+            device = request.get('payload', {}).get('device')
+        )
+
     def get_utterance(self, request: dict):
         payload = request.get('payload')
 
@@ -132,11 +137,3 @@ class SberUserHub(UserHub):
             return None
 
         return uuid.get('userId')
-
-    def handle(self, request: dict):
-        utterance = self.get_utterance(request)
-
-        if self.should_run_callback(utterance):
-            return self.make_response(request, 'Маруся, запусти скилл оранжевая нить')
-
-        return super().handle(request)
@@ -0,0 +1,165 @@
+from sys import getsizeof
+
+
+POST_ELEMENT_SEP_MARK = ' @ '
+
+
+def count_marks(text: str):
+    return text.count(POST_ELEMENT_SEP_MARK)
+
+
+def count_junction_marks(lhs: str, rhs: str):  # marks which appear only after joining two posts with a space
+    return count_marks(f'{lhs} {rhs}') - count_marks(lhs) - count_marks(rhs)
+
+
+class SegmentIndex:  # prefix sums over fixed posts of a thread which allow to find segment boundaries with a binary search
+
+    def __init__(self, posts: list[str], hub):
+        self.posts = posts
+
+        self.fix = hub.fix
+        self.n_chars_per_response = hub.n_chars_per_response
+        self.n_chars_per_overlap_post = hub.n_chars_per_overlap_post
+        self.post_sep_length = hub.post_sep_length
+        self.post_element_sep_length = hub.post_element_sep_length
+        self.overlap = hub.overlap
+
+        self.fixed = fixed = [self.fix(post) for post in posts]
+
+        raw_lengths = [0]  # raw_lengths[i] is the total length of the first i posts before fixing
+        lengths = [0]  # lengths[i] is the total length of the first i fixed posts
+        marks = [0]  # marks[i] is the number of separator marks in the first i fixed posts
+        junctions = [0]  # junctions[i] is the number of separator marks formed by joining the first i + 1 fixed posts
+
+        for i, (post, fixed_post) in enumerate(zip(posts, fixed)):
+            raw_lengths.append(raw_lengths[-1] + len(post))
+            lengths.append(lengths[-1] + len(fixed_post))
+            marks.append(marks[-1] + count_marks(fixed_post))
+
+            if i > 0:
+                junctions.append(junctions[-1] + count_junction_marks(fixed[i - 1], fixed_post))
+
+        self._raw_lengths = raw_lengths
+        self._lengths = lengths
+        self._marks = marks
+        self._junctions = junctions
+
+    def __len__(self):
+        return len(self.posts)
+
+    @property
+    def size(self):  # approximate number of bytes, posts which are not changed by fixing are shared with the post list
+        return (
+            sum(getsizeof(fixed_post) for post, fixed_post in zip(self.posts, self.fixed) if fixed_post is not post) +
+            sum(getsizeof(values) + sum(getsizeof(value) for value in values) for values in (self._raw_lengths, self._lengths, self._marks, self._junctions)) +
+            getsizeof(self.fixed)
+        )
+
+    def _raw_length(self, start: int, end: int):
+        n_posts = len(self.posts)
+
+        return self._raw_lengths[min(end, n_posts)] - self._raw_lengths[min(start, n_posts)]
+
+    def _next_distance(self, distance: int, n_posts: int):
+        return (0 if distance is None else distance) + n_posts - 1 - (0 if distance is None else self.overlap)
+
+    def _truncate(self, top_posts: list[str], post: str, distance: int):  # the segment is full and post doesn't fit in it
+        if len(top_posts) <= self.overlap:
+            post = post[:self.n_chars_per_response - sum(len(top_post) for top_post in top_posts)]
+
+            sep_mark_fix = self.post_element_sep_length * count_marks(post)
+            if sep_mark_fix > 0:
+                post = post[:-sep_mark_fix]
+
+            top_posts.append(post)
+
+        return top_posts, self._next_distance(distance, len(top_posts))
+
+    def get(self, distance: int = None):  # posts of the segment which starts at the given distance and the distance for the next segment
+        posts = self.posts
+        n_posts = len(posts)
+        overlap = self.overlap
+        n_chars_per_response = self.n_chars_per_response
+        post_sep_length = self.post_sep_length
+        post_element_sep_length = self.post_element_sep_length
+
+        head = []  # posts which are different from their fixed versions in the index
+
+        if distance is None:
+            start = 0
+        else:
+            if distance >= n_posts:
+                return None, None
+
+            start = max(0, distance - overlap)
+
+            if (n_chars_per_overlap_post := self.n_chars_per_overlap_post) is None:
+                shift = 0  # skip n posts in the beginning if they are too large to not to stuck with them
+
+                while self._raw_length(start + shift, start + overlap) > n_chars_per_response:
+                    shift += 1
+
+                start += shift
+            else:
+                head = [self.fix(post[:n_chars_per_overlap_post]) for post in posts[start:start + overlap]]
+                start += len(head)
+
+        n_chars = 0
+        top_posts = []
+
+        for post in head:
+            n_chars += len(post)
+
+            if (
+                n_chars +
+                post_sep_length * len(top_posts) +
+                post_element_sep_length * count_marks(' '.join([*top_posts, post]))
+            ) < n_chars_per_response:
+                top_posts.append(post)
+            else:
+                return self._truncate(top_posts, post, distance)
+
+        lengths = self._lengths
+        marks = self._marks
+        junctions = self._junctions
+        n_head_posts = len(top_posts)
+
+        if start < n_posts:
+            n_head_marks = count_marks(' '.join(top_posts)) + (0 if n_head_posts < 1 else count_junction_marks(top_posts[-1], self.fixed[start]))
+        else:
+            n_head_marks = 0
+
+        def fits(i: int, exact: bool = False):  # whether the segment can be extended up to the i-th post inclusively
+            if exact:  # marks may span several junctions if there are posts shorter than a mark, so count them in the joined segment
+                n_marks = count_marks(' '.join([*top_posts, *self.fixed[start:i + 1]]))
+            else:
+                n_marks = n_head_marks + marks[i + 1] - marks[start] + junctions[i] - junctions[start]
+
+            return (
+                n_chars + lengths[i + 1] - lengths[start] +
+                post_sep_length * (n_head_posts + i - start) +
+                post_element_sep_length * n_marks
+            ) < n_chars_per_response
+
+        lower, upper = start, n_posts  # the first post which doesn't fit is in [lower, upper]
+
+        while lower < upper:
+            middle = (lower + upper) // 2
+
+            if fits(middle):
+                lower = middle + 1
+            else:
+                upper = middle
+
+        while lower > start and not fits(lower - 1, exact = True):
+            lower -= 1
+
+        while lower < n_posts and fits(lower, exact = True):
+            lower += 1
+
+        top_posts.extend(self.fixed[start:lower])
+
+        if lower < n_posts:
+            return self._truncate(top_posts, self.fixed[lower], distance)
+
+        return top_posts, self._next_distance(distance, len(top_posts))
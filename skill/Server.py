@@ -1,50 +1,155 @@
-from flask import Flask, request, json
+import logging
+from os import fork, waitpid, kill, _exit
+from time import perf_counter
+from signal import SIGTERM
+from socket import create_server
 
-from much import Fetcher
+from flask import Flask, Response, request
+from werkzeug.serving import make_server
 
+from . import DEFAULT_PORT, DEFAULT_DEADLINE
 from .Handler import UserHub
+from .PostRepository import PostRepository, DEFAULT_POST_CACHE_SIZE, DEFAULT_POST_TTL
+from .Session import DEFAULT_SESSION_TIMEOUT, DEFAULT_MAX_SESSIONS
+from .Catalog import Catalog, DEFAULT_REFRESH_INTERVAL
+from .Blocklist import Blocklist
+from .Backend import MemoryBackend, SqliteBackend
+from .PostStore import PostStore
+from .Capture import Capture
+from .Metrics import Metrics, Collected, CONTENT_TYPE
+from .Json import JsonProvider, RawJson, MIMETYPE
+from .Upstream import Upstream
+from .util import get_logger, StartupProfile
 
 from .SberUserHub import SberUserHub
 from .VkUserHub import VkUserHub
 from .YandexUserHub import YandexUserHub
 
 
-DEFAULT_PORT = 1217
-OFFSET = 100
+request_logger = get_logger('request')
+response_logger = get_logger('response')
+server_logger = get_logger('server')
 
 
 class Server:
-    def __init__(self, verbose: bool = False, callback: bool = False, disabled_thread_starters: str = None):
-        self.app = Flask('2scht speech skill server')
-        self.fetcher = Fetcher()
-        self.verbose = verbose
+    def __init__(self,
+        verbose: bool = False, callback: bool = False, disabled_thread_starters: str = None,
+        catalog_refresh_interval: float = DEFAULT_REFRESH_INTERVAL, post_cache_size: int = DEFAULT_POST_CACHE_SIZE,
+        session_timeout: float = DEFAULT_SESSION_TIMEOUT, max_sessions: int = DEFAULT_MAX_SESSIONS, backend: str = None,
+        post_store: str = None, capture: str = None, capture_rate: float = 1.0, post_ttl: float = DEFAULT_POST_TTL, profile: StartupProfile = None,
+        deadline: float = DEFAULT_DEADLINE
+    ):
+        self.profile = profile = StartupProfile() if profile is None else profile  # init steps are timed even if imports are not
+
+        with profile.step('app'):
+            self.app = Flask('2scht speech skill server')
+            self.app.json = JsonProvider(self.app)
+
+        self.upstream = upstream = Upstream()  # connections to 2ch are shared by the catalog and all hubs
+        self.verbose = verbose  # dump request and response bodies regardless of the configured log level
         self.callback = callback
-
-        json.provider.DefaultJSONProvider.ensure_ascii = False
-
-        if disabled_thread_starters is not None:
-            with open(disabled_thread_starters, 'r', encoding = 'utf-8') as file:
-                disabled_thread_starters = [line[:-1] for line in file.readlines()]
-
-        self.sber = SberUserHub(disabled_thread_starters = disabled_thread_starters)
-        self.vk = VkUserHub(callback = callback, disabled_thread_starters = disabled_thread_starters)
-        self.yandex = YandexUserHub(disabled_thread_starters = disabled_thread_starters)
-
-    def serve(self, host: str = '0.0.0.0', port = DEFAULT_PORT):
+        self.capture = None if capture is None else Capture(capture, capture_rate)
+
+        with profile.step('blocklist'):
+            self.blocklist = blocklist = Blocklist() if disabled_thread_starters is None else Blocklist.from_file(disabled_thread_starters)  # reloaded on every catalog refresh
+
+        with profile.step('backend'):
+            self.backend = backend = MemoryBackend() if backend is None else SqliteBackend(backend)  # sqlite database is shared by all workers
+            self.metrics = metrics = Metrics()
+            self.catalog = catalog = Catalog(blocklist, refresh_interval = catalog_refresh_interval, backend = backend, metrics = metrics, upstream = upstream)
+            self.posts = posts = PostRepository(  # a thread opened from several platforms is downloaded and kept once
+                upstream, metrics, backend, None if post_store is None else PostStore(post_store), max_size = post_cache_size, ttl = post_ttl
+            )
+
+        hub_kwargs = {
+            'catalog': catalog,
+            'backend': backend,
+            'metrics': metrics,
+            'upstream': upstream,
+            'posts': posts,
+            'session_timeout': session_timeout,
+            'max_sessions': max_sessions,
+            'deadline': deadline
+        }
+
+        with profile.step('hubs'):
+            self.sber = SberUserHub(**hub_kwargs)
+            self.vk = VkUserHub(callback = callback, **hub_kwargs)
+            self.yandex = YandexUserHub(**hub_kwargs)
+
+        with profile.step('routes'):
+            self._add_metrics()
+            self._add_routes()
+
+    @property
+    def ready(self):  # the catalog has been pulled and filtered with the blocklist, so listing threads doesn't wait for 2ch
+        return self.catalog.peek() is not None
+
+    def _add_metrics(self):
+        metrics = self.metrics
+        hubs = (self.sber, self.vk, self.yandex)
+
+        def collect_post_cache(key: str):
+            return lambda: [((), self.posts.stats[key])]
+
+        def collect_segment_cache(key: str):
+            return lambda: [((hub.vendor, ), hub.segment_cache_stats[key]) for hub in hubs]
+
+        def collect_rendered_cache(key: str):
+            return lambda: [((hub.vendor, ), hub.rendered_cache_stats[key]) for hub in hubs]
+
+        def collect_page_cache(key: str):
+            return lambda: [((hub.vendor, ), hub.page_cache_stats[key]) for hub in hubs]
+
+        metrics.add(Collected('skill_sessions', 'Active sessions', ('vendor', ), lambda: [((hub.vendor, ), hub.n_sessions) for hub in hubs]))
+        metrics.add(Collected('skill_post_cache_hits_total', 'Post cache hits', (), collect_post_cache('hits'), 'counter'))
+        metrics.add(Collected('skill_post_cache_misses_total', 'Post cache misses', (), collect_post_cache('misses'), 'counter'))
+        metrics.add(Collected('skill_post_cache_evictions_total', 'Post cache evictions', (), collect_post_cache('evictions'), 'counter'))
+        metrics.add(Collected('skill_post_cache_entries', 'Threads in the post cache', (), collect_post_cache('entries')))
+        metrics.add(Collected('skill_post_cache_bytes', 'Approximate size of the post cache', (), collect_post_cache('size')))
+        metrics.add(Collected('skill_segment_cache_hits_total', 'Segment index cache hits', ('vendor', ), collect_segment_cache('hits'), 'counter'))
+        metrics.add(Collected('skill_segment_cache_misses_total', 'Segment index cache misses', ('vendor', ), collect_segment_cache('misses'), 'counter'))
+        metrics.add(Collected('skill_segment_cache_entries', 'Versions of threads in the segment index cache', ('vendor', ), collect_segment_cache('entries')))
+        metrics.add(Collected('skill_segment_cache_bytes', 'Approximate size of the segment index cache', ('vendor', ), collect_segment_cache('size')))
+        metrics.add(Collected('skill_rendered_cache_hits_total', 'Rendered segment cache hits', ('vendor', ), collect_rendered_cache('hits'), 'counter'))
+        metrics.add(Collected('skill_rendered_cache_misses_total', 'Rendered segment cache misses', ('vendor', ), collect_rendered_cache('misses'), 'counter'))
+        metrics.add(Collected('skill_rendered_cache_bytes', 'Size of serialized segments in the rendered segment cache', ('vendor', ), collect_rendered_cache('size')))
+        metrics.add(Collected('skill_page_cache_hits_total', 'Thread listing page cache hits', ('vendor', ), collect_page_cache('hits'), 'counter'))
+        metrics.add(Collected('skill_page_cache_misses_total', 'Thread listing page cache misses', ('vendor', ), collect_page_cache('misses'), 'counter'))
+        metrics.add(
+            Collected('skill_response_length_limit', 'Max number of characters per response', ('vendor', ), lambda: [((hub.vendor, ), hub.n_chars_per_response) for hub in hubs])
+        )
+        metrics.add(
+            Collected(
+                'skill_upstream_circuit_open', 'Whether calls to the upstream fail immediately', ('source', ),
+                lambda: [((breaker.name, ), int(breaker.is_open)) for breaker in (self.upstream.catalog_breaker, self.upstream.thread_breaker)]
+            )
+        )
+        metrics.add(
+            Collected('skill_catalog_threads', 'Threads in the current catalog snapshot', (), lambda: [] if (snapshot := self.catalog.peek()) is None else [((), len(snapshot))])
+        )
+
+    def _add_routes(self):
         app = self.app
 
         def handle(hub: UserHub):
             verbose = self.verbose
+            body = request.json
+
+            if verbose or request_logger.isEnabledFor(logging.DEBUG):
+                request_logger.log(logging.INFO if verbose else logging.DEBUG, 'Request: %s', body)
 
-            if verbose:
-                print('-' * OFFSET + 'request')
-                print(request.json)
+            start = perf_counter()
+            response = hub.handle(body)
 
-            response = hub.handle(request.json)
+            if (capture := self.capture) is not None:
+                capture.record(request.path, body, response, perf_counter() - start)
 
-            if verbose:
-                print('-' * OFFSET + 'response')
-                print(request.json)
+            if verbose or response_logger.isEnabledFor(logging.DEBUG):
+                response_logger.log(logging.INFO if verbose else logging.DEBUG, 'Response: %s', response.decode() if isinstance(response, RawJson) else response)
+
+            if isinstance(response, RawJson):  # constant responses come pre-serialized
+                return app.response_class(response, mimetype = MIMETYPE)
 
             return response
 
@@ -61,4 +166,46 @@ class Server:
 
             return handle(self.vk)
 
-        app.run(host = host, port = port)  # , ssl_context = ('cert/cert.pem', 'cert/key.pem'))
+        @app.route('/metrics', methods = ['GET'])
+        def metrics():  # values are collected by the worker which handles the scrape
+            return Response(self.metrics.render(), content_type = CONTENT_TYPE)
+
+        @app.route('/ready', methods = ['GET'])
+        def ready():  # a proxy should be pointed at the server only once it is ready, the catalog is warmed up in background
+            if self.ready:
+                return Response('ready\n', content_type = 'text/plain')
+
+            return Response('warming up\n', status = 503, content_type = 'text/plain')
+
+    def serve(self, host: str = '0.0.0.0', port = DEFAULT_PORT, workers: int = 1):
+        app = self.app
+
+        if workers < 2:
+            self.catalog.start()
+            app.run(host = host, port = port)  # , ssl_context = ('cert/cert.pem', 'cert/key.pem'))
+            return
+
+        if not self.backend.shared:
+            raise ValueError('Multiple workers require a shared backend, because requests of the same user may be handled by different workers')
+
+        server_socket = create_server((host, port))  # bound once and inherited by all workers
+        server_socket.set_inheritable(True)
+
+        pids = []
+
+        for _ in range(workers):
+            if (pid := fork()) == 0:
+                self.catalog.start()  # threads don't survive fork, so each worker refreshes its own catalog
+                make_server(host, port, app, threaded = True, fd = server_socket.fileno()).serve_forever()
+                _exit(0)
+
+            pids.append(pid)
+
+        server_logger.info('Started %d workers on %s:%d', workers, host, port)
+
+        try:
+            for pid in pids:
+                waitpid(pid, 0)
+        except KeyboardInterrupt:
+            for pid in pids:
+                kill(pid, SIGTERM)
@@ -0,0 +1,71 @@
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from threading import Lock
+from time import time
+
+
+DEFAULT_SESSION_TIMEOUT = 1800  # seconds
+DEFAULT_MAX_SESSIONS = 100000
+
+
+@dataclass
+class Session:  # conversation state of a single user, refers to the shared catalog snapshot by its version
+    snapshot: int = None  # version of the catalog snapshot which the user is browsing
+    offset: int = 0  # number of threads to skip when showing next thread to user
+    last_batch_size: int = None  # number of threads shown in the last message
+
+    index: int = 0  # index of the next thread to show to user
+    distance: int = 0  # number of posts to skip when showing current thread to user in the next response
+    last_distance: int = 0  # number of posts to skip which was used in the last response
+    posts_version: float = None  # version of the post list of the current thread
+    loading: bool = False  # the current thread wasn't loaded in time when it was picked, so the next utterance reads it from the beginning
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, state: dict):
+        return cls(**state)
+
+
+class SessionStore:  # drops sessions which have been idle for too long and the least recently active ones when there are too many
+
+    def __init__(self, timeout: float = DEFAULT_SESSION_TIMEOUT, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+
+        self._sessions = OrderedDict()  # user id -> (session, time of the last access), the least recently active user goes first
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, user_id: str):
+        with self._lock:
+            if (entry := self._sessions.get(user_id)) is None:
+                return None
+
+            session, accessed = entry
+
+            if time() - accessed > self.timeout:
+                self._sessions.pop(user_id)
+                return None
+
+            return session
+
+    def put(self, user_id: str, session: Session):
+        current_time = time()
+
+        with self._lock:
+            sessions = self._sessions
+
+            sessions[user_id] = (session, current_time)
+            sessions.move_to_end(user_id)
+
+            while len(sessions) > 0:
+                _, (_, accessed) = next(iter(sessions.items()))
+
+                if len(sessions) > self.max_sessions or current_time - accessed > self.timeout:
+                    sessions.popitem(last = False)
+                else:
+                    break
@@ -1,5 +1,6 @@
 import re
-from bs4 import BeautifulSoup
+
+from .util import normalize
 
 
 SPACE = ' '
@@ -8,39 +9,66 @@ MAX_HEADER_LENGTH = 100
 BR_TAG = re.compile('<br/?>')
 
 
-class Thread:
+class Thread:  # html of the thread title is parsed once when the thread is created and is not kept afterwards
+    __slots__ = ('id', 'length', 'freshness', 'rank', 'header', 'normalized_title')
+
     def __init__(self, title: str, length: int, freshness: float, id_: int):
-        self.title = title
+        self.id = id_
         self.length = length
         self.freshness = freshness
-        self.id = id_
+        self.rank = (length, freshness)
+
+        from bs4 import BeautifulSoup  # slow to import, titles are parsed in background once the server is up
+
+        strong = (soup := BeautifulSoup(title, features = 'html.parser')).find('strong')
+
+        if strong is None:
+            self.header = soup.get_text(separator = SPACE).split('.', maxsplit = 1)[0][:MAX_HEADER_LENGTH]
+        else:
+            self.header = strong.get_text(separator = SPACE)
+
+        title_text = BeautifulSoup(BR_TAG.sub('\n', title), features = 'html.parser').get_text(separator = ' ')
+        self.normalized_title = normalize(title_text)
 
     def __repr__(self):
         return f'{self.header} (length = {self.length}, freshness = {self.freshness:.2f}, id = {self.id})'
 
-    @property
-    def title_text(self):
-        # return BeautifulSoup(BR_TAG.sub(self.title, '\n'), features = 'html.parser').get_text(separator = ' ')
-        return BeautifulSoup(BR_TAG.sub('\n', self.title), features = 'html.parser').get_text(separator = ' ')
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__ if field != 'rank'}
 
-    @property
-    def header(self):
-        strong = (title := BeautifulSoup(self.title, features = 'html.parser')).find('strong')
+    @classmethod
+    def from_dict(cls, state: dict):  # restore a thread without parsing its title again
+        thread = cls.__new__(cls)
 
-        if strong is None:
-            return title.get_text(separator = SPACE).split('.', maxsplit = 1)[0][:MAX_HEADER_LENGTH]
+        for field, value in state.items():
+            if field in cls.__slots__:  # snapshots saved by older versions have fields which are not kept anymore
+                setattr(thread, field, value)
+
+        thread.rank = (thread.length, thread.freshness)
 
-        return strong.get_text(separator = SPACE)
+        return thread
+
+    def with_rank(self, length: int, freshness: float):  # the same thread at another position in the catalog, the title is not parsed again
+        if length == self.length and freshness == self.freshness:
+            return self
+
+        return Thread.from_dict({**self.to_dict(), 'length': length, 'freshness': freshness})
 
     @property
     def link(self):
         return f'https://2ch.su/b/res/{self.id}.html'
 
     @classmethod
-    def from_list(cls, items: list):
+    def from_list(cls, items: list, previous: dict = None):  # previous maps thread ids to (title, thread) pairs, threads with the same title are reused
         n_items = len(items)
+        threads = []
+
+        for i, item in enumerate(items):
+            freshness = 1 - i / n_items
+
+            if previous is not None and (known := previous.get(item['num'])) is not None and known[0] == item['comment']:
+                threads.append(known[1].with_rank(item['posts_count'], freshness))
+            else:
+                threads.append(Thread(item['comment'], item['posts_count'], freshness, item['num']))
 
-        return tuple(
-            Thread(item['comment'], item['posts_count'], 1 - i / n_items, item['num'])
-            for i, item in enumerate(items)
-        )
+        return tuple(threads)
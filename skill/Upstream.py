@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from threading import Lock
+from time import monotonic
+
+
+HTTP_SUCCESS = 200
+
+DEFAULT_TIMEOUT = 10  # seconds per request, the catalog and a thread page are small enough to be downloaded faster than that
+DEFAULT_CONNECT_TIMEOUT = 3  # seconds
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5  # seconds before the first retry, doubled before each next one
+DEFAULT_POOL_SIZE = 16  # kept-alive connections
+DEFAULT_MAX_FAILURES = 5  # consecutive failures which open the circuit
+DEFAULT_RESET_TIMEOUT = 30  # seconds during which calls fail immediately after the circuit has been opened
+DEFAULT_MAX_DOWNLOADS = 8  # threads downloaded at once
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class UpstreamError(Exception):
+    pass
+
+
+class CircuitOpenError(UpstreamError):
+    pass
+
+
+class CircuitBreaker:  # fails fast after several consecutive failures, lets a single probe through once the cooldown is over
+
+    def __init__(self, name: str, max_failures: int = DEFAULT_MAX_FAILURES, reset_timeout: float = DEFAULT_RESET_TIMEOUT, failures: tuple[type] = (UpstreamError, )):
+        self.name = name
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.failures = failures  # other errors are caused by the content of a response, which means the upstream is up
+
+        self.n_failures = 0
+
+        self._opened_at = None
+        self._probing = False
+        self._lock = Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def call(self, function, *args, **kwargs):
+        with self._lock:
+            if (opened_at := self._opened_at) is not None:
+                if self._probing or monotonic() - opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f'Upstream {self.name} is unavailable, retrying in at most {self.reset_timeout} seconds')
+
+                self._probing = probing = True
+            else:
+                probing = False
+
+        try:
+            result = function(*args, **kwargs)
+        except self.failures:
+            with self._lock:
+                self.n_failures += 1
+
+                if probing or self.n_failures >= self.max_failures:
+                    self._opened_at = monotonic()
+
+                if probing:
+                    self._probing = False
+
+            raise
+        except Exception:
+            self._close()
+            raise
+
+        self._close()
+
+        return result
+
+    def _close(self):
+        with self._lock:
+            self.n_failures = 0
+            self._opened_at = None
+            self._probing = False
+
+
+class Upstream:  # http client shared by the catalog and all hubs, keeps connections to 2ch alive and stops calling it while it is down
+
+    def __init__(self,
+        timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+        pool_size: int = DEFAULT_POOL_SIZE, max_failures: int = DEFAULT_MAX_FAILURES, reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        max_downloads: int = DEFAULT_MAX_DOWNLOADS
+    ):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+
+        self._session = None  # requests and much are slow to import, so the clients are made on first use
+        self._fetcher = None
+        self._clients_lock = Lock()
+        self._downloads = ThreadPoolExecutor(max_workers = max_downloads, thread_name_prefix = 'upstream')
+
+        self.catalog_breaker = CircuitBreaker('catalog', max_failures, reset_timeout)
+        self.thread_breaker = CircuitBreaker('thread', max_failures, reset_timeout)
+
+    @property
+    def session(self):
+        if (session := self._session) is None:
+            with self._clients_lock:
+                if (session := self._session) is None:
+                    self._session = session = self._make_session()
+
+        return session
+
+    def _make_session(self):
+        from requests import Session
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retries = self.retries
+
+        session = Session()
+        adapter = HTTPAdapter(
+            pool_connections = self.pool_size, pool_maxsize = self.pool_size,
+            max_retries = Retry(
+                total = retries, connect = retries, read = retries, status = retries, backoff_factor = self.backoff,
+                status_forcelist = RETRY_STATUSES, allowed_methods = ('GET', ), raise_on_status = False
+            )
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+        return session
+
+    @property
+    def fetcher(self):  # thread pages are downloaded and parsed by much, which makes its own requests
+        if (fetcher := self._fetcher) is None:
+            with self._clients_lock:
+                if (fetcher := self._fetcher) is None:
+                    from importlib import import_module
+                    from much import Fetcher
+
+                    import_module('much.Fetcher').get = self._get_page  # much calls requests.get without a timeout and retries ssl errors forever
+                    self._fetcher = fetcher = Fetcher()
+
+        return fetcher
+
+    @fetcher.setter
+    def fetcher(self, fetcher):
+        self._fetcher = fetcher
+
+    def _get_page(self, url: str):  # requests of much go through the pooled session and end in time
+        from requests import RequestException
+
+        try:
+            return self.session.get(url, timeout = (self.connect_timeout, self.timeout))
+        except RequestException as e:  # much doesn't catch it, so the download ends instead of being retried
+            raise UpstreamError(f'Can\'t fetch {url}: {e}') from e
+
+    def get_json(self, url: str):
+        return self.catalog_breaker.call(self._get_json, url)
+
+    def _get_json(self, url: str):
+        from requests import RequestException
+
+        try:
+            response = self.session.get(url, timeout = (self.connect_timeout, self.timeout))
+        except RequestException as e:
+            raise UpstreamError(f'Can\'t pull {url}: {e}') from e
+
+        if (status_code := response.status_code) != HTTP_SUCCESS:
+            raise UpstreamError(f'Can\'t pull {url}, response status code is {status_code}')
+
+        return response.json()
+
+    def fetch(self, url: str, verbose: bool = False):  # topics of the thread
+        return self.thread_breaker.call(self._fetch, url, verbose)
+
+    def _fetch(self, url: str, verbose: bool):
+        future = self._downloads.submit(self.fetcher.fetch, url, verbose = verbose)  # much doesn't limit the time of a download, so the caller stops waiting instead
+
+        try:
+            return future.result(timeout = self.timeout)
+        except FutureTimeoutError as e:
+            raise UpstreamError(f'Can\'t fetch {url} in {self.timeout} seconds') from e
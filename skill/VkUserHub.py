@@ -1,4 +1,6 @@
 from .Handler import UserHub
+from .util import get_logger
+from .Json import Template, placeholder
 
 
 # PRIMARY_VOICE = 'vasilisa-hifigan'
@@ -8,8 +10,11 @@ SECONDARY_VOICE = 'pavel-hifigan'
 CALLBACK_TRIGGER = 'Салют, запусти нужен навык оранжевая нить'
 CALLBACK_TRIGGER_LENGTH = len(CALLBACK_TRIGGER)
 
+logger = get_logger('response')
+
 
 class VkUserHub(UserHub):
+    vendor = 'vk'
 
     def __init__(self, *args, n_threads_per_response: int = 10, n_chars_per_response = 6000, callback: bool = False, **kwargs):
         super().__init__(*args, n_threads_per_response = n_threads_per_response, n_chars_per_response = n_chars_per_response - (CALLBACK_TRIGGER_LENGTH if callback else 0), **kwargs)
@@ -20,7 +25,11 @@ class VkUserHub(UserHub):
         session = request.get('session')
         version = request.get('version')
 
-        print(f'Response length (text) is {sum(len(post) for post in posts)}')
+        length = self.get_response_length(posts)
+
+        logger.info('Response length (text) is %d', length)
+
+        self.observe_response_length(length)
 
         if self.callback:
             posts.append(CALLBACK_TRIGGER)
@@ -42,6 +51,9 @@ class VkUserHub(UserHub):
             'version': version
         }
 
+    def get_response_length(self, posts: list[str]):
+        return sum(len(post) for post in posts)
+
     def make_response(self, request: dict, text: str, ssml: str = None, interactive: bool = True):
         if ssml is not None:
             raise ValueError('SSML markup is not supported')
@@ -49,7 +61,9 @@ class VkUserHub(UserHub):
         session = request.get('session')
         version = request.get('version')
 
-        print(f'Response length (text) is {len(text)}')
+        logger.info('Response length (text) is %d', len(text))
+
+        self.observe_response_length(len(text))
 
         return {
             'response': {
@@ -60,6 +74,12 @@ class VkUserHub(UserHub):
             'version': version
         }
 
+    def make_template(self, make_body):
+        return Template(make_body({'session': placeholder('session'), 'version': placeholder('version')}), fields = ('session', 'version'))
+
+    def render_template(self, template: Template, request: dict):
+        return template.render(session = request.get('session'), version = request.get('version'))
+
     def get_utterance(self, request: dict):
         request_prop = request.get('request')
 
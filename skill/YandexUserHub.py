@@ -1,7 +1,15 @@
 from .VkUserHub import VkUserHub
+from .util import get_logger
+from .Json import Template
+
+
+POST_SEP = 'sil <[1500]>'
+
+logger = get_logger('response')
 
 
 class YandexUserHub(VkUserHub):
+    vendor = 'yandex'
 
     def __init__(self, *args, n_threads_per_response: int = 10, n_chars_per_response = 1024, version: str = '1.0', overlap: int = 0, **kwargs):
         super().__init__(*args, n_threads_per_response = n_threads_per_response, n_chars_per_response = n_chars_per_response, overlap = overlap, **kwargs)
@@ -9,13 +17,27 @@ class YandexUserHub(VkUserHub):
         self.version = version
 
     def posts_to_response(self, request: dict, posts: list[str]):
-        return self.make_response(request, '\n'.join(posts), 'sil <[1500]>'.join(posts))
+        return self.make_response(request, '\n'.join(posts), POST_SEP.join(posts))
+
+    def get_response_length(self, posts: list[str]):
+        return len(POST_SEP.join(posts))
+
+    def get_user_id(self, request: dict):  # users who are not logged in come without an id, so their state is kept for the dialog
+        if (user_id := super().get_user_id(request)) is not None:
+            return user_id
+
+        if (session := request.get('session')) is None:
+            return None
+
+        return session.get('session_id')
 
     def make_response(self, request: dict, text: str, ssml: str = None, interactive: bool = True):
         if ssml is None:
-            print(f'Response length (text) is {len(text)}')
+            logger.info('Response length (text) is %d', len(text))
         else:
-            print(f'Response length (ssml) is {len(ssml)}')
+            logger.info('Response length (ssml) is %d', len(ssml))
+
+        self.observe_response_length(len(text if ssml is None else ssml))
 
         state = request.get('state')
 
@@ -52,6 +74,15 @@ class YandexUserHub(VkUserHub):
 
         return response
 
+    def make_template(self, make_body):  # the version is the same for all requests
+        return Template(make_body({}), optional_fields = ('session_state', 'user_state', 'application_state'))
+
+    def render_template(self, template: Template, request: dict):
+        if (state := request.get('state')) is None:
+            return template.render()
+
+        return template.render(session_state = state.get('session'), user_state = state.get('user'), application_state = state.get('application'))
+
     def can_handle(self, request: dict):
         meta = request.get('meta')
 
@@ -69,6 +100,6 @@ class YandexUserHub(VkUserHub):
         utterance = self.get_utterance(request)
 
         if utterance in (None, '', 'ping'):
-            return self.make_response(request, 'Привет, скажи "запусти навык" для вывода списка тредов, после чего назови номер понравившегося треда и я его озвучу')
+            return self.make_constant_response(request, 'Привет, скажи "запусти навык" для вывода списка тредов, после чего назови номер понравившегося треда и я его озвучу')
 
         return super().handle(request)
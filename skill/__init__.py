@@ -0,0 +1,2 @@
+DEFAULT_PORT = 1217  # shared by the server and the command line, which doesn't import the server until it is needed
+DEFAULT_DEADLINE = 2.5  # seconds to respond in, the strictest platform stops waiting after 3 seconds
@@ -1,6 +1,32 @@
-from click import group, option
+from threading import Thread as ExecutableThread
 
-from .Server import Server, DEFAULT_PORT
+from click import group, option, argument, BadParameter
+
+from . import DEFAULT_PORT, DEFAULT_DEADLINE
+from .Catalog import DEFAULT_REFRESH_INTERVAL
+from .PostRepository import DEFAULT_POST_CACHE_SIZE, DEFAULT_POST_TTL
+from .Session import DEFAULT_SESSION_TIMEOUT, DEFAULT_MAX_SESSIONS
+from .util import setup_logging, get_logger, StartupProfile
+from .util.log import CATEGORIES
+
+
+logger = get_logger('server')
+
+STARTUP_REPORT_TIMEOUT = 30  # seconds to wait for the catalog before the startup profile is reported without the time until ready
+
+
+def parse_pairs(pairs: tuple[str], convert = str):  # 'key=value' strings from repeated options
+    parsed = {}
+
+    for pair in pairs:
+        key, sep, value = pair.partition('=')
+
+        if not sep:
+            raise BadParameter(f'Expected key=value, got {pair}')
+
+        parsed[key.strip()] = convert(value.strip())
+
+    return parsed
 
 
 @group()
@@ -12,8 +38,72 @@ def main():
 @option('--port', '-p', type = int, default = DEFAULT_PORT)
 @option('--callback', '-c', is_flag = True)
 @option('--disabled-thread-starters', type = str, default = None)
-def serve(port: int, callback: bool, disabled_thread_starters: str):
-    Server(callback = callback, disabled_thread_starters = disabled_thread_starters).serve(port = port)
+@option('--catalog-refresh-interval', type = float, default = DEFAULT_REFRESH_INTERVAL, help = 'seconds between catalog refreshes')
+@option('--post-cache-size', type = int, default = DEFAULT_POST_CACHE_SIZE, help = 'max number of bytes occupied by cached posts, which are shared by all vendors')
+@option('--post-ttl', type = float, default = DEFAULT_POST_TTL, help = 'seconds after which cached posts of a growing thread are refreshed in background')
+@option('--session-timeout', type = float, default = DEFAULT_SESSION_TIMEOUT, help = 'seconds of inactivity after which user session is dropped')
+@option('--max-sessions', type = int, default = DEFAULT_MAX_SESSIONS, help = 'max number of user sessions kept by each vendor')
+@option('--backend', type = str, default = None, help = 'path to sqlite database with sessions and posts shared by workers, state is kept in memory if omitted')
+@option('--workers', '-w', type = int, default = 1, help = 'number of worker processes, more than one requires --backend')
+@option('--post-store', type = str, default = None, help = 'path to sqlite database with downloaded threads which is kept between restarts')
+@option('--capture', type = str, default = None, help = 'path to jsonl file to append handled requests and responses to')
+@option('--capture-rate', type = float, default = 1.0, help = 'fraction of requests to capture')
+@option('--log-level', type = str, default = 'info', help = 'debug level includes full request and response bodies')
+@option('--log-category', type = str, multiple = True, help = f'category=level or category=off, categories are {", ".join(CATEGORIES)}')
+@option('--log-sample', type = str, multiple = True, help = 'category=rate, fraction of records of the category below the warning level to keep')
+@option('--deadline', type = float, default = DEFAULT_DEADLINE, help = 'seconds to respond in, an interim reply is sent if the catalog or a thread takes longer to load')
+@option('--profile-startup', is_flag = True, help = 'log time spent importing each module, initializing the server and warming up the catalog')
+def serve(
+    port: int, callback: bool, disabled_thread_starters: str, catalog_refresh_interval: float, post_cache_size: int, post_ttl: float, session_timeout: float, max_sessions: int,
+    backend: str, workers: int, post_store: str, capture: str, capture_rate: float, log_level: str, log_category: tuple[str], log_sample: tuple[str],
+    deadline: float, profile_startup: bool
+):
+    try:
+        setup_logging(log_level, parse_pairs(log_category), parse_pairs(log_sample, float))
+    except ValueError as e:
+        raise BadParameter(str(e))
+
+    profile = StartupProfile().start() if profile_startup else None
+
+    from .Server import Server
+
+    server = Server(
+        callback = callback, disabled_thread_starters = disabled_thread_starters, catalog_refresh_interval = catalog_refresh_interval,
+        post_cache_size = post_cache_size, post_ttl = post_ttl, session_timeout = session_timeout, max_sessions = max_sessions, backend = backend,
+        post_store = post_store, capture = capture, capture_rate = capture_rate, profile = profile,
+        deadline = deadline
+    )
+
+    if profile is not None:  # workers warm up their own catalogs after fork, so only a single process waits for it
+        ExecutableThread(target = report_startup, args = (profile, server.catalog if workers < 2 else None), daemon = True).start()
+
+    server.serve(port = port, workers = workers)
+
+
+def report_startup(profile: StartupProfile, catalog = None):
+    if catalog is not None and catalog.wait(STARTUP_REPORT_TIMEOUT) is not None:
+        profile.mark_ready()
+
+    profile.stop()  # imports made by the catalog refresh are included if it is done in time
+
+    logger.info(profile.report())
+
+    if catalog is not None and profile.ready is None:  # 2ch is unavailable, the server gets ready once a refresh succeeds
+        catalog.wait()
+        profile.mark_ready()
+
+        logger.info('Ready in %.1f ms', profile.ready * 1000)
+
+
+@main.command()
+@argument('path', type = str)
+@option('--url', '-u', type = str, default = f'http://localhost:{DEFAULT_PORT}')
+@option('--speed', '-s', type = float, default = 1.0, help = 'replay speed relative to the original pace, 0 sends requests without delays')
+@option('--concurrency', '-c', type = int, default = 16, help = 'max number of requests in flight')
+def replay(path: str, url: str, speed: float, concurrency: int):
+    from .Capture import replay as replay_capture
+
+    replay_capture(path, url, speed = speed, concurrency = concurrency)
 
 
 if __name__ == '__main__':
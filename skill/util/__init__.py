@@ -1 +1,5 @@
-from .string import normalize, normalize_spaces
+from .string import normalize, normalize_many, normalize_spaces
+from .trie import PrefixTrie
+from .flight import SingleFlight
+from .log import get_logger, setup_logging
+from .startup import StartupProfile
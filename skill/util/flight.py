@@ -0,0 +1,45 @@
+from concurrent.futures import Future, Executor
+from threading import Lock
+
+
+class SingleFlight:  # concurrent calls with the same key share the result of a single execution
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        future, leader = self._join(key)
+
+        if leader:
+            self._run(key, future, function, args, kwargs)
+
+        return future.result()
+
+    def submit(self, executor: Executor, key, function, *args, **kwargs):  # same as do, but the execution is left to the executor and the shared future is returned right away
+        future, leader = self._join(key)
+
+        if leader:
+            executor.submit(self._run, key, future, function, args, kwargs)
+
+        return future
+
+    def _join(self, key):
+        with self._lock:
+            if (future := self._futures.get(key)) is None:
+                self._futures[key] = future = Future()
+                return future, True
+
+        return future, False
+
+    def _run(self, key, future: Future, function, args: tuple, kwargs: dict):
+        try:
+            future.set_result(function(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._futures.pop(key)
+
+    def __contains__(self, key):
+        return key in self._futures
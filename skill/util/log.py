@@ -0,0 +1,114 @@
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from os import getpid
+from queue import Queue, Full
+from random import random
+from sys import stdout
+
+
+ROOT = 'skill'
+CATEGORIES = ('request', 'response', 'catalog', 'upstream', 'capture', 'server', 'access')
+LOGGER_NAMES = {**{category: f'{ROOT}.{category}' for category in CATEGORIES}, 'access': 'werkzeug'}  # access log is written by the development server
+
+DEFAULT_QUEUE_SIZE = 10000  # records which haven't been written yet, new records are dropped when the queue is full
+DEFAULT_FORMAT = '%(asctime)s %(levelname)s %(name)s %(message)s'
+
+OFF = 'off'
+
+
+def get_logger(category: str):
+    return logging.getLogger(LOGGER_NAMES[category])
+
+
+class SamplingFilter(logging.Filter):  # keeps only a fraction of records of each category, warnings and errors always pass
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+
+        self.rates = {LOGGER_NAMES[category]: rate for category, rate in rates.items()}
+
+    def filter(self, record: logging.LogRecord):
+        if record.levelno >= logging.WARNING or (rate := self.rates.get(record.name)) is None:
+            return True
+
+        return random() < rate
+
+
+class BackgroundHandler(QueueHandler):  # request threads only put records into a queue, the target handlers run in a separate thread
+
+    def __init__(self, *handlers: logging.Handler, queue_size: int = DEFAULT_QUEUE_SIZE):
+        super().__init__(Queue(maxsize = queue_size))
+
+        self.handlers = handlers
+        self.queue_size = queue_size
+        self.n_dropped = 0
+
+        self._pid = None
+        self._listener = None
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid != getpid():  # the listener is started lazily, because threads don't survive fork
+            with self.lock:  # logging reinitializes the lock after fork, so it is never inherited locked
+                if self._pid != getpid():  # another thread could have started the listener meanwhile
+                    self._start()
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.n_dropped += 1
+
+    def _start(self):
+        if self._pid is not None:  # the queue could have been locked by the listener of the parent process at the moment of fork
+            self.queue = Queue(maxsize = self.queue_size)
+
+        self._pid = getpid()
+        self._listener = listener = QueueListener(self.queue, *self.handlers, respect_handler_level = True)
+
+        listener.start()
+
+    def stop(self):  # waits until the records which are already in the queue are written
+        if (listener := self._listener) is not None and self._pid == getpid():
+            listener.stop()
+
+        self._listener = None
+        self._pid = None
+
+    def close(self):  # called by logging on exit
+        self.stop()
+        super().close()
+
+
+def setup_logging(level: str = 'info', categories: dict[str, str] = None, rates: dict[str, float] = None, stream = stdout, fmt: str = DEFAULT_FORMAT):
+    # categories map names from CATEGORIES to levels which override the default one, or to 'off'
+    for category in (*({} if categories is None else categories), *({} if rates is None else rates)):
+        if category not in CATEGORIES:
+            raise ValueError(f'Unknown log category {category}, expected one of {", ".join(CATEGORIES)}')
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(fmt))
+
+    background_handler = BackgroundHandler(handler)
+
+    if rates:
+        background_handler.addFilter(SamplingFilter(rates))
+
+    for logger in (logging.getLogger(ROOT), get_logger('access')):
+        logger.setLevel(level.upper())
+        logger.propagate = False
+
+        for previous_handler in logger.handlers[:]:
+            logger.removeHandler(previous_handler)
+            previous_handler.close()
+
+        logger.addHandler(background_handler)
+
+    for category, category_level in ({} if categories is None else categories).items():
+        logger = get_logger(category)
+
+        if category_level == OFF:
+            logger.disabled = True
+        else:
+            logger.disabled = False
+            logger.setLevel(category_level.upper())
+
+    return background_handler
@@ -0,0 +1,115 @@
+import sys
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from threading import local
+from time import perf_counter
+
+
+DEFAULT_N_MODULES = 20  # slowest imports to report
+
+
+class _TimedLoader:  # runs the original loader and puts it back in place once the module is executed
+
+    def __init__(self, loader, profile):
+        self._loader = loader
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        loader = self._loader
+        profile = self._profile
+
+        profile._enter()
+        start = perf_counter()
+
+        try:
+            loader.exec_module(module)
+        finally:
+            module.__loader__ = module.__spec__.loader = loader
+            profile._exit(module.__name__, perf_counter() - start)
+
+
+class _TimingFinder(MetaPathFinder):  # finds modules with the other finders and wraps their loaders
+
+    def __init__(self, profile):
+        self._profile = profile
+
+    def find_spec(self, name, path, target = None):
+        for finder in sys.meta_path:
+            if finder is self or (find_spec := getattr(finder, 'find_spec', None)) is None:
+                continue
+
+            if (spec := find_spec(name, path, target)) is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self._profile)
+
+                return spec
+
+        return None
+
+
+class StartupProfile:  # time spent importing each module and initializing each component of the server
+
+    def __init__(self):
+        self.imports = {}  # module name -> (seconds including nested imports, own seconds)
+        self.steps = []  # (component, seconds)
+        self.ready = None  # seconds from the start of profiling until the server is ready to handle traffic
+
+        self._start = perf_counter()
+        self._finder = _TimingFinder(self)
+        self._local = local()  # modules may be imported by several threads at once
+
+    def start(self):
+        sys.meta_path.insert(0, self._finder)
+
+        return self
+
+    def stop(self):
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    @contextmanager
+    def step(self, name: str):
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.steps.append((name, perf_counter() - start))
+
+    def mark_ready(self):
+        self.ready = perf_counter() - self._start
+
+    def _enter(self):
+        if (stack := getattr(self._local, 'stack', None)) is None:
+            self._local.stack = stack = []
+
+        stack.append(0.0)  # time spent importing nested modules
+
+    def _exit(self, name: str, elapsed: float):
+        stack = self._local.stack
+        nested = stack.pop()
+
+        self.imports[name] = (elapsed, elapsed - nested)
+
+        if stack:
+            stack[-1] += elapsed
+
+    def report(self, n_modules: int = DEFAULT_N_MODULES):
+        lines = ['Startup profile:']
+
+        for name, seconds in self.steps:
+            lines.append(f'init {name}: {seconds * 1000:.1f} ms')
+
+        for name, (total, own) in sorted(self.imports.items(), key = lambda item: item[1][0], reverse = True)[:n_modules]:
+            lines.append(f'import {name}: {total * 1000:.1f} ms, {own * 1000:.1f} ms own')
+
+        if self.ready is not None:
+            lines.append(f'ready in {self.ready * 1000:.1f} ms')
+
+        return '\n'.join(lines)
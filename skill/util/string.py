@@ -1,29 +1,51 @@
 import re
-from emoji import replace_emoji
+from re import escape
 
+from .trie import PrefixTrie
+
+
+URL_PATTERN = r'http\S+'
+HANDLE_PATTERN = r'@(?:(?!http\S)\S)+'  # urls inside handles are removed separately, so a handle ends where a url begins
+REF_MARK_PATTERN = r'\A>'
+ZWJ = '\u200d'  # joins emoji which form a sequence
+VARIATION_SELECTORS = '\ufe0e\ufe0f'
 
-URL_REGEXP = re.compile(r'http[^\s]+')
-HANDLE_REGEXP = re.compile(r'@[^\s]+')
 SPACE_REGEXP = re.compile(r'\s+')
-REF_MARK = re.compile(r'^>')
+VARIATION_SELECTOR_REGEXP = re.compile(f'[{VARIATION_SELECTORS}]')  # stray selectors left after the noise is replaced are dropped without a space
+
+_noise_regexp = None
+
+
+def get_noise_regexp():  # a run of spaces, urls, handles, ref marks and emoji, which is replaced by a single space
+    global _noise_regexp
+
+    if _noise_regexp is None:  # emoji pattern is large, so it is compiled on first use
+        from emoji import EMOJI_DATA  # slow to import, not needed until the first text is normalized
+        from emoji.unicode_codes import STATUS
+
+        starts = ''.join(escape(char) for char in sorted({key[0] for key in EMOJI_DATA}))
+        components = {key for key, data in EMOJI_DATA.items() if data['status'] == STATUS['component']}
+        heads = PrefixTrie(key for key in EMOJI_DATA if len(key) == 1 or len(key) == 2 and key[1] in components)  # emoji which the tokenizer matches again before a stray zwj
+
+        # emoji are matched the same way the emoji tokenizer does it: the trie is followed as far as the text goes, an emoji with an optional modifier is matched
+        # on its own if it starts a broken zwj sequence, and a zwj is dropped along with the emoji before it only if it follows a char which can start an emoji
+        emoji = rf'(?:{PrefixTrie(EMOJI_DATA).to_pattern(atomic = True)}|(?=..?{ZWJ}){heads.to_pattern()}(?={ZWJ}))(?:(?<=[{starts}]){ZWJ})?'
+        noise = rf'(?:{REF_MARK_PATTERN}|\s|{URL_PATTERN}|{HANDLE_PATTERN}|{emoji})'
+
+        _noise_regexp = re.compile(rf'{noise}(?:{noise}|[{VARIATION_SELECTORS}])*')  # stray variation selectors may continue a run, but can't start one
+
+    return _noise_regexp
 
 
 def normalize(text: str):
-    return normalize_spaces(
-        replace_emoji(
-            HANDLE_REGEXP.sub(
-                ' ',
-                URL_REGEXP.sub(
-                    ' ',
-                    REF_MARK.sub(
-                        ' ',
-                        text.replace('☹️', '')
-                    )
-                )
-            ),
-            ' '
-        )
-    )
+    return VARIATION_SELECTOR_REGEXP.sub('', get_noise_regexp().sub(' ', text.replace('☹️', '')))
+
+
+def normalize_many(texts: list[str]):
+    sub = get_noise_regexp().sub
+    strip = VARIATION_SELECTOR_REGEXP.sub
+
+    return [strip('', sub(' ', text.replace('☹️', ''))) for text in texts]
 
 
 def normalize_spaces(text: str):
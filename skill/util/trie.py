@@ -0,0 +1,88 @@
+from re import escape
+
+
+END = None  # key of the value stored in a trie node for the word which ends in this node
+MAX_CHAR_CLASS_GAP = 64  # code points which are closer than that are merged into one range, a few wide ranges are faster to test than many narrow ones
+
+
+class PrefixTrie:
+
+    def __init__(self, words: tuple[str] = ()):
+        self.root = {}
+
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str, value = True):
+        node = self.root
+
+        for char in word:
+            node = node.setdefault(char, {})
+
+        node[END] = value
+
+    def match_prefix(self, text: str):  # value of the shortest word which is a prefix of the text
+        node = self.root
+
+        if END in node:
+            return node[END]
+
+        for char in text:
+            if (node := node.get(char)) is None:
+                return None
+
+            if END in node:
+                return node[END]
+
+        return None
+
+    def to_pattern(self, atomic: bool = False):  # regular expression which matches any word from the trie, the longest one is preferred
+        # an atomic pattern follows the text as far as the trie goes and doesn't match if it stops in the middle of a word, the same way a tokenizer walks the trie
+        if len(self.root) < 1:
+            return '(?!)'
+
+        return f'(?=[{_to_char_class(char for char in self.root if char is not END)}]){_to_pattern(self.root, atomic)}'  # lookahead quickly skips chars which can't start a word
+
+
+def _to_char_class(chars: list[str]):  # a superset of the given chars as a sequence of ranges
+    ranges = []
+
+    for code in sorted(ord(char) for char in chars):
+        if ranges and code - ranges[-1][1] <= MAX_CHAR_CLASS_GAP:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+
+    return ''.join(
+        escape(chr(first)) if first == last else f'{escape(chr(first))}-{escape(chr(last))}'
+        for first, last in ranges
+    )
+
+
+def _to_pattern(node: dict, atomic: bool = False):
+    alternatives = []
+    chars = []  # words which end right after this char
+
+    for char, child in node.items():
+        if char is END:
+            continue
+
+        if len(child) == 1 and END in child:
+            chars.append(escape(char))
+        else:
+            alternatives.append(escape(char) + _to_pattern(child, atomic))
+
+    if len(chars) == 1:
+        alternatives.append(chars[0])
+    elif len(chars) > 1:
+        alternatives.append(f'[{"".join(chars)}]')
+
+    pattern = alternatives[0] if len(alternatives) == 1 else f'(?:{"|".join(alternatives)})'
+
+    if END not in node:
+        return pattern
+
+    if atomic:  # the word may end here only if the text doesn't go on along the trie
+        return f'(?:{pattern}|(?![{"".join(escape(char) for char in node if char is not END)}]))'
+
+    return f'(?:{pattern})?'